@@ -0,0 +1,23 @@
+#
+# Application configuration. The .env file is loaded here, once per process, before any module
+# reads the environment; import this module ahead of anything that calls os.getenv at import time.
+#
+import os
+
+import dotenv
+
+dotenv.load_dotenv()
+
+SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
+SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
+JWT_SECRET = os.getenv('JWT_SECRET')
+REDIRECT_URI = os.getenv('REDIRECT_URI')
+
+# Optional CSV of songs with audio features; when set, recommendations are computed locally
+SONG_CATALOG_PATH = os.getenv('SONG_CATALOG_PATH')
+
+# Set by the Lambda runtime. The handler then builds and warms the services during the init
+# phase (which SnapStart snapshots and provisioned concurrency runs ahead of traffic) instead of
+# on every invocation.
+ON_LAMBDA = bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+PREWARM = os.getenv('PREWARM', '1' if ON_LAMBDA else '0').lower() in ('1', 'true', 'yes')
@@ -1,19 +1,47 @@
-from fastapi import Depends, FastAPI
-import uvicorn
-from fastapi.middleware.cors import CORSMiddleware
-from mangum import Mangum
+import logging
 
-from app.routers import spotify
+from framework.utils.startup import StartupTimer
 
-app = FastAPI()
+# Cold starts are broken down by phase; the total is logged and exported on /metrics
+startup_timer = StartupTimer()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=['*']
-)
+with startup_timer.phase("config"):
+    from app import config
 
+with startup_timer.phase("import_framework"):
+    from contextlib import asynccontextmanager
 
-app.include_router(spotify.router)
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from mangum import Mangum
+
+with startup_timer.phase("import_app"):
+    from app.routers import spotify
+    from app.services.service_factory import ServiceFactory
+    from app.utils.responses import FastJSONResponse
+    from framework.middleware.metrics import STATS, MetricsMiddleware, metrics_response
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Services live for the whole application so their pools and caches are shared by requests
+    await ServiceFactory.startup()
+    yield
+    await ServiceFactory.shutdown()
+
+
+with startup_timer.phase("build_app"):
+    app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=['*']
+    )
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(spotify.router)
 
 
 @app.get("/")
@@ -21,8 +49,25 @@ async def root():
     return {"message": "Hello Bigger Applications!"}
 
 
-handler = Mangum(app=app)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
+
+
+# Mangum would otherwise run the lifespan, and so build and tear down every service, on each
+# invocation. On Lambda the services are built once per container instead: here, during the init
+# phase, when PREWARM is set (the default on Lambda), or else on first use.
+handler = Mangum(app=app, lifespan="off")
+
+if config.PREWARM:
+    with startup_timer.phase("warm_services"):
+        ServiceFactory.warm()
+
+STATS.register("startup", "app", startup_timer.stats)
+logger.info("Startup took %s", startup_timer.summary())
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -15,4 +15,18 @@ class Playlist(BaseModel):
     owner_id: str                           # Spotify ID of the owner
     image_url: Optional[str] = None         # URL of the playlist image
     spotify_branch: Optional[str] = None    # Spotify branch ID
+    snapshot_id: Optional[str] = None       # Version of the playlist the tracks were read from
     tracks: Optional[list[str]] = None      # List of Spotify track IDs
+
+
+class TrackChunkResult(BaseModel):
+    position: int                           # Index in the playlist of the chunk's first track
+    size: int                               # Number of tracks in the chunk
+    attempts: int                           # Requests it took to add the chunk
+    seconds: float                          # Wall time spent on the chunk, retries included
+
+
+class CreatedPlaylist(BaseModel):
+    id: str                                 # Spotify ID of the new playlist
+    snapshot_id: Optional[str] = None       # Snapshot after the last chunk was added
+    chunks: list[TrackChunkResult] = []     # Per-chunk timings, in playlist order
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Optional, List
+from typing import Iterable, Optional, List
 
 from pydantic import BaseModel
 from datetime import datetime
@@ -31,7 +31,27 @@ class Song(BaseModel):
     valence: Optional[float] = None
     tempo: Optional[float] = None
     duration_ms: Optional[float] = None
-    
+
+
+# Traits feature name -> Song field holding it. Traits also has time_signature, which Song does
+# not carry, so min/max/target_time_signature cannot be checked against a Song.
+TRAIT_FIELDS = {
+    "acousticness": "acousticness",
+    "danceability": "danceability",
+    "duration_ms": "duration_ms",
+    "energy": "energy",
+    "instrumentalness": "instrumentalness",
+    "key": "key",
+    "liveness": "liveness",
+    "loudness": "loudness",
+    "mode": "mode",
+    "popularity": "track_popularity",
+    "speechiness": "speechiness",
+    "tempo": "tempo",
+    "valence": "valence",
+}
+
+
 class Traits(BaseModel):
     min_acousticness: Optional[float] = None
     max_acousticness: Optional[float] = None
@@ -79,8 +99,46 @@ class Traits(BaseModel):
     market: Optional[str] = None
     genres: Optional[List[str]] = None
     seed_tracks: Optional[List[str]] = None
-    
+
+    def bounds(self, fields: Optional[Iterable[str]] = None) -> dict:
+        """
+        {Song field: (min, max)} for every feature with a min_* or max_* set; either end may be None.
+        Only Song fields in `fields` are considered when it is given.
+        """
+        fields = set(fields) if fields is not None else None
+        bounds = {}
+        for feature, field in TRAIT_FIELDS.items():
+            if fields is not None and field not in fields:
+                continue
+            low, high = getattr(self, f"min_{feature}"), getattr(self, f"max_{feature}")
+            if low is not None or high is not None:
+                bounds[field] = (low, high)
+        return bounds
+
+    def cache_key(self) -> tuple:
+        """
+        Canonical, hashable form of the traits: None fields are dropped, genres are sorted and
+        deduplicated, and floats are rounded so that equivalent requests share a key.
+        """
+        key = []
+        for name, value in self:
+            if value is None:
+                continue
+            if name == "genres":
+                value = tuple(sorted(set(value)))
+            elif isinstance(value, list):
+                value = tuple(value)
+            elif isinstance(value, float):
+                value = round(value, 6)
+                if value.is_integer():
+                    value = int(value)
+            key.append((name, value))
+        return tuple(key)
+
     class Config:
+        # Traits is only built inside /recommendations, so its 45-field schema is generated on
+        # first use rather than at import
+        defer_build = True
         json_schema_extra = {
             "example": {
                 "min_acousticness": None,
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from functools import cached_property
+from typing import Any, List, Optional
+
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
+
+# Shapes of the Spotify Web API responses we read. Only the fields we use are declared: the
+# adapters below validate response bytes directly in pydantic-core and drop everything else, so
+# the parsed payloads stay plain dicts that are smaller and cheaper to build than json.loads().
+# Spotify sends null for many fields, hence Optional everywhere.
+
+
+class SpotifyImage(TypedDict, total=False):
+    url: Optional[str]
+
+
+class SpotifyArtist(TypedDict, total=False):
+    id: Optional[str]
+    name: Optional[str]
+
+
+class SpotifyAlbum(TypedDict, total=False):
+    id: Optional[str]
+    name: Optional[str]
+    release_date: Optional[str]
+
+
+class SpotifyTrack(TypedDict, total=False):
+    id: Optional[str]
+    name: Optional[str]
+    artists: Optional[List[SpotifyArtist]]
+    album: Optional[SpotifyAlbum]
+    popularity: Optional[int]
+    duration_ms: Optional[int]
+
+
+class SpotifyUser(TypedDict, total=False):
+    id: Optional[str]
+    display_name: Optional[str]
+    email: Optional[str]
+    country: Optional[str]
+    images: Optional[List[SpotifyImage]]
+
+
+class TrackPage(TypedDict, total=False):
+    items: Optional[List[Optional[SpotifyTrack]]]
+    next: Optional[str]
+    total: Optional[int]
+
+
+class SearchResponse(TypedDict, total=False):
+    tracks: Optional[TrackPage]
+
+
+class TracksResponse(TypedDict, total=False):
+    tracks: Optional[List[Optional[SpotifyTrack]]]
+
+
+class PlaylistOwner(TypedDict, total=False):
+    id: Optional[str]
+
+
+class PlaylistTracksRef(TypedDict, total=False):
+    href: Optional[str]
+    total: Optional[int]
+
+
+class SimplifiedPlaylist(TypedDict, total=False):
+    id: Optional[str]
+    name: Optional[str]
+    description: Optional[str]
+    owner: Optional[PlaylistOwner]
+    images: Optional[List[SpotifyImage]]
+    tracks: Optional[PlaylistTracksRef]
+    snapshot_id: Optional[str]
+
+
+class PlaylistPage(TypedDict, total=False):
+    items: Optional[List[Optional[SimplifiedPlaylist]]]
+    next: Optional[str]
+
+
+class PlaylistTrackItem(TypedDict, total=False):
+    track: Optional[SpotifyTrack]
+
+
+class PlaylistTracksPage(TypedDict, total=False):
+    items: Optional[List[Optional[PlaylistTrackItem]]]
+    next: Optional[str]
+
+
+class LazyTypeAdapter:
+    """
+    A TypeAdapter built on first use instead of at import, which keeps pydantic's schema
+    generation for these shapes out of cold starts. warm() builds it ahead of time.
+    """
+
+    def __init__(self, type_: Any):
+        self.type = type_
+
+    @cached_property
+    def adapter(self) -> TypeAdapter:
+        return TypeAdapter(self.type)
+
+    def validate_json(self, data, **kwargs) -> Any:
+        return self.adapter.validate_json(data, **kwargs)
+
+    def warm(self):
+        self.adapter
+
+
+user_adapter = LazyTypeAdapter(SpotifyUser)
+search_adapter = LazyTypeAdapter(SearchResponse)
+tracks_adapter = LazyTypeAdapter(TracksResponse)
+playlist_page_adapter = LazyTypeAdapter(PlaylistPage)
+playlist_tracks_page_adapter = LazyTypeAdapter(PlaylistTracksPage)
+adapters = (user_adapter, search_adapter, tracks_adapter, playlist_page_adapter, playlist_tracks_page_adapter)
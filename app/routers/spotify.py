@@ -1,24 +1,27 @@
 from fastapi import APIRouter, status, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
+from app.config import REDIRECT_URI
 from app.models.user import User
 from app.models.spotify_token import SpotifyToken
 from app.models.song import Song, Traits
 from app.services.service_factory import ServiceFactory
-import dotenv
-import os
+from app.services.spotify_api import RECOMMENDATION_BATCH_SIZE
+from app.utils.responses import FastJSONResponse
+import json
 
 
-dotenv.load_dotenv()
-redirect_uri = os.getenv('REDIRECT_URI')
+redirect_uri = REDIRECT_URI
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 router = APIRouter()
 
 
 class LoginRequest(BaseModel):
     auth_code: str
+    prefetch: Optional[bool] = None     # Warm the user's library in the background; defaults to PREFETCH_ON_LOGIN
 
 
 class LoginResponse(BaseModel):
@@ -26,27 +29,80 @@ class LoginResponse(BaseModel):
     token: SpotifyToken
 
 class CreatePlaylistRequest(BaseModel):
-    token: SpotifyToken
+    token: Optional[SpotifyToken] = None    # Defaults to the token held since login
     name: str
     song_ids: List[str]
 
+class TracksRequest(BaseModel):
+    ids: List[str]
+    spotify_access_token: Optional[str] = None     # Only needed when the app has no client credentials
+    market: Optional[str] = None
+
+class RecommendationBatchRequest(BaseModel):
+    queries: List[Traits] = Field(min_length=1, max_length=RECOMMENDATION_BATCH_SIZE)
+    spotify_access_token: Optional[str] = None     # Only needed when the app has no client credentials
+
+class RecommendationResult(BaseModel):
+    songs: Optional[List[Song]] = None      # Set when the query succeeded
+    status_code: Optional[int] = None       # Set, with detail, when it failed
+    detail: Optional[str] = None
+
+
+async def resolve_spotify_token(user_id: str, spotify_token: Optional[SpotifyToken]) -> SpotifyToken:
+    """Use the token the client sent, or else the one the token manager holds for the user."""
+    # The user is here, so a prefetch started at their login is still worth finishing
+    ServiceFactory.get_service("LibraryPrefetcher").seen(user_id)
+    if spotify_token is not None:
+        return spotify_token
+
+    token_manager = ServiceFactory.get_service("SpotifyTokenManager")
+    spotify_token = await token_manager.get_token(user_id)
+    if spotify_token is None:
+        raise HTTPException(status_code=401, detail="No Spotify token for user, please log in again")
+    return spotify_token
+
 
 @router.post("/auth/login", tags=["users"], status_code=status.HTTP_201_CREATED)
 async def login(request: LoginRequest) -> LoginResponse:
     api_service = ServiceFactory.get_service("SpotifyAPIService")
-    token = api_service.login(request.auth_code, redirect_uri)
-    user = api_service.get_user_info(token)
+    token = await api_service.login(request.auth_code, redirect_uri)
+    user = await api_service.get_user_info(token)
+    ServiceFactory.get_service("SpotifyTokenManager").store(user.id, token)
+
+    prefetcher = ServiceFactory.get_service("LibraryPrefetcher")
+    if request.prefetch if request.prefetch is not None else prefetcher.enabled:
+        prefetcher.submit(user.id, token)
     return LoginResponse(user=user, token=token)
 
 
 @router.get("/users/{user_id}/playlists", tags=["users", "playlists"])
-async def get_user_playlists(user_id: str, spotify_token: SpotifyToken, token: str = Depends(oauth2_scheme)):
+async def get_user_playlists(user_id: str,
+                             spotify_token: Optional[SpotifyToken] = None,
+                             stream: bool = False,
+                             token: str = Depends(oauth2_scheme)):
+    """
+    Return the user's playlists with their track ids. With `stream=true` the response is NDJSON,
+    one playlist per line, written as soon as each playlist's tracks have been fetched.
+    """
     api_service = ServiceFactory.get_service("SpotifyAPIService")
 
     if not api_service.validate_token(token, id=user_id, scope=("/users/{user_id}/playlists", "GET")):
         raise HTTPException(status_code=401, detail="Invalid Token")
 
-    return api_service.get_user_playlists(spotify_token)
+    spotify_token = await resolve_spotify_token(user_id, spotify_token)
+    if not stream:
+        return FastJSONResponse(await api_service.get_user_playlists(spotify_token, user_id=user_id), exclude_none=False)
+
+    async def ndjson():
+        try:
+            async for playlist in api_service.iter_user_playlists(spotify_token, user_id=user_id):
+                yield playlist.model_dump_json() + "\n"
+        except Exception as e:
+            # The status line has already been sent, so report the failure as the last line
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            yield json.dumps({"error": detail}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 @router.post("/users/{user_id}/playlists", tags=["playlists"])
 async def create_playlist(user_id: str, request: CreatePlaylistRequest, token: str = Depends(oauth2_scheme)):
@@ -55,23 +111,47 @@ async def create_playlist(user_id: str, request: CreatePlaylistRequest, token: s
     if not api_service.validate_token(token, id=user_id, scope=("/users/{user_id}/playlists", "POST")):
         raise HTTPException(status_code=401, detail="Invalid Token")
 
-    api_service.create_playlist(user_id, request.token, request.name, request.song_ids)
+    spotify_token = await resolve_spotify_token(user_id, request.token)
+    return await api_service.create_playlist(user_id, spotify_token, request.name, request.song_ids)
 
 @router.get("/users/{user_id}/refreshed_token", tags=["users"])
 async def get_refreshed_token(user_id: str,
-                              access_token: str,
-                              token_type: str,
-                              scope: str,
-                              expires_in: int,
-                              refresh_token: str,
+                              access_token: Optional[str] = None,
+                              token_type: Optional[str] = None,
+                              scope: Optional[str] = None,
+                              expires_in: Optional[int] = None,
+                              refresh_token: Optional[str] = None,
                               token: str = Depends(oauth2_scheme)):
     api_service = ServiceFactory.get_service("SpotifyAPIService")
-    spotify_token = SpotifyToken(access_token=access_token, token_type=token_type,
-                                 scope=scope, expires_in=expires_in, refresh_token=refresh_token)
+    token_manager = ServiceFactory.get_service("SpotifyTokenManager")
 
     if not api_service.validate_token(token, scope=("/users/{user_id}/refreshed_token", "GET")):
         raise HTTPException(status_code=401, detail="Invalid Token")
-    return api_service.refresh_token(spotify_token)
+
+    # Tokens held since login are kept fresh in the background, so this is usually a memory read.
+    # They are only handed back to, and only replaced by, the user they belong to.
+    is_owner = api_service.validate_token(token, id=user_id)
+    if is_owner and user_id in token_manager:
+        return await token_manager.get_token(user_id)
+
+    if refresh_token is None:
+        raise HTTPException(status_code=401, detail="No Spotify token for user, please log in again")
+    spotify_token = SpotifyToken(access_token=access_token or "", token_type=token_type or "Bearer",
+                                 scope=scope or "", expires_in=expires_in or 0, refresh_token=refresh_token)
+    spotify_token = await api_service.refresh_token(spotify_token)
+    if is_owner:
+        token_manager.store(user_id, spotify_token)
+    return spotify_token
+
+
+@router.post("/tracks", tags=["tracks"])
+async def get_tracks(request: TracksRequest, token: str = Depends(oauth2_scheme)) -> List[Song]:
+    api_service = ServiceFactory.get_service("SpotifyAPIService")
+
+    if not api_service.validate_token(token, scope=("/tracks", "POST")):
+        raise HTTPException(status_code=401, detail="Invalid Token")
+
+    return FastJSONResponse(await api_service.get_tracks(request.ids, request.spotify_access_token, request.market))
 
 
 @router.get("/recommendations", tags=["recommendations"], status_code=status.HTTP_200_OK)
@@ -123,7 +203,7 @@ async def get_recommendations(  # TODO: better way to do this? dont want to use
     genres: Optional[List[str]] = Query(default=None),
     seed_tracks: Optional[List[str]] = None,
     token: str = Depends(oauth2_scheme),
-    spotify_access_token: str = None
+    spotify_access_token: Optional[str] = None     # Only needed when the app has no client credentials
 ) -> List[Song]:
     api_service = ServiceFactory.get_service("SpotifyAPIService")
     traits = Traits(
@@ -177,9 +257,39 @@ async def get_recommendations(  # TODO: better way to do this? dont want to use
     try:
         if not api_service.validate_token(token, scope=("/recommendations", "GET")):
             raise HTTPException(status_code=401, detail="Invalid Token")
-        return api_service.get_recommendations(traits, spotify_access_token)
+        return FastJSONResponse(await api_service.get_recommendations(traits, spotify_access_token))
+    except Exception as e:
+        # raise nested exception instead of generic 500
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/recommendations/batch", tags=["recommendations"], status_code=status.HTTP_200_OK)
+async def get_recommendations_batch(request: RecommendationBatchRequest,
+                                    token: str = Depends(oauth2_scheme)) -> List[RecommendationResult]:
+    """
+    Run many recommendation queries in one round trip. Results come back in the order of the
+    queries; a query that fails gets its status code and detail instead of songs, without
+    failing the others.
+    """
+    api_service = ServiceFactory.get_service("SpotifyAPIService")
+    try:
+        if not api_service.validate_token(token, scope=("/recommendations/batch", "POST")):
+            raise HTTPException(status_code=401, detail="Invalid Token")
+        outcomes = await api_service.get_recommendations_batch(request.queries, request.spotify_access_token)
     except Exception as e:
         # raise nested exception instead of generic 500
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
+
+    results = []
+    for outcome in outcomes:
+        if isinstance(outcome, HTTPException):
+            results.append(RecommendationResult(status_code=outcome.status_code, detail=str(outcome.detail)))
+        elif isinstance(outcome, Exception):
+            results.append(RecommendationResult(status_code=500, detail=str(outcome)))
+        else:
+            results.append(RecommendationResult(songs=outcome))
+    return FastJSONResponse(results)
@@ -0,0 +1,164 @@
+import os
+import asyncio
+import time
+from typing import Optional
+
+from app.models.spotify_token import SpotifyToken
+from framework.middleware.metrics import STATS
+from framework.utils.rate_limit import Priority
+
+# Off unless enabled here or asked for by the login request
+PREFETCH_ON_LOGIN = os.getenv('PREFETCH_ON_LOGIN', '0').lower() in ('1', 'true', 'yes')
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 2))
+PREFETCH_QUEUE_SIZE = int(os.getenv('PREFETCH_QUEUE_SIZE', 100))
+# A prefetch is cancelled if the user has not used the API this many seconds after logging in,
+# and in any case after PREFETCH_MAX_SECONDS
+PREFETCH_IDLE_TIMEOUT = float(os.getenv('PREFETCH_IDLE_TIMEOUT', 20))
+PREFETCH_MAX_SECONDS = float(os.getenv('PREFETCH_MAX_SECONDS', 120))
+PREFETCH_MAX_TRACKS = int(os.getenv('PREFETCH_MAX_TRACKS', 2000))
+
+
+class LibraryPrefetcher:
+    """
+    Warms the SpotifyAPIService caches with a user's library right after login, so the first
+    screen finds their playlists (and the metadata of their tracks) already cached.
+
+    Jobs go through a bounded queue served by a fixed number of worker tasks; when the queue is
+    full new jobs are dropped rather than piling up. A job is cancelled if the user does not
+    show up (see seen()) within `idle_timeout` seconds of logging in.
+    """
+
+    def __init__(self, api_service,
+                 enabled: bool = PREFETCH_ON_LOGIN,
+                 workers: int = PREFETCH_WORKERS,
+                 queue_size: int = PREFETCH_QUEUE_SIZE,
+                 idle_timeout: float = PREFETCH_IDLE_TIMEOUT,
+                 max_seconds: float = PREFETCH_MAX_SECONDS,
+                 max_tracks: int = PREFETCH_MAX_TRACKS,
+                 clock=time.monotonic):
+        """
+        :param api_service: The SpotifyAPIService whose caches are warmed.
+        :param enabled: Whether logins prefetch when the request does not say.
+        :param workers: How many prefetches run at once.
+        :param queue_size: How many prefetches may wait for a worker.
+        :param idle_timeout: Seconds after login by which the user must have shown up.
+        :param max_seconds: Seconds after login at which any prefetch is cancelled.
+        :param max_tracks: Most track ids whose metadata is prefetched per user.
+        :param clock: Monotonic time source, overridable for tests.
+        """
+        self.api_service = api_service
+        self.enabled = enabled
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.max_seconds = max_seconds
+        self.max_tracks = max_tracks
+        self.clock = clock
+        self.queue_size = queue_size
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._jobs = {}         # user id -> time of the login, while queued or running
+        self._seen = {}         # user id -> last time the user called the API since a login
+        STATS.register("prefetch", "library", self.stats)
+
+    def submit(self, user_id: str, token: SpotifyToken) -> bool:
+        """
+        Queue a prefetch of the user's library. Returns False if it was not queued: the queue is
+        full, one is already pending for the user, or there is no running event loop.
+        """
+        if user_id in self._jobs:
+            return False
+        try:
+            self._start()
+        except RuntimeError:
+            return False
+
+        try:
+            self._queue.put_nowait((user_id, token, self.clock()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+        self._jobs[user_id] = self.clock()
+        self._seen.pop(user_id, None)
+        self.submitted += 1
+        return True
+
+    def seen(self, user_id: str):
+        """Record that the user is using the API, which keeps their prefetch going."""
+        if user_id in self._jobs:
+            self._seen[user_id] = self.clock()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._jobs),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._workers and self._workers[0].get_loop() is loop:
+            return
+        # First use, or a new event loop: the old queue and workers belong to the previous one
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._jobs.clear()
+        self._workers = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _work(self):
+        while True:
+            user_id, token, submitted_at = await self._queue.get()
+            try:
+                await self._run(user_id, token, submitted_at)
+            finally:
+                self._jobs.pop(user_id, None)
+                self._seen.pop(user_id, None)
+                self._queue.task_done()
+
+    async def _run(self, user_id: str, token: SpotifyToken, submitted_at: float):
+        task = asyncio.create_task(self._prefetch(user_id, token))
+        deadline = submitted_at + self.idle_timeout
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline - self.clock()))
+                if done:
+                    break
+                if user_id in self._seen and deadline < submitted_at + self.max_seconds:
+                    # The user showed up, so the rest of the library is worth fetching
+                    deadline = submitted_at + self.max_seconds
+                    continue
+                task.cancel()
+                self.cancelled += 1
+                return
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+        if task.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def _prefetch(self, user_id: str, token: SpotifyToken):
+        # The playlists first, since that is what the first screen shows
+        playlists = await self.api_service.get_user_playlists(token, user_id=user_id)
+
+        track_ids = list(dict.fromkeys(track_id for playlist in playlists for track_id in playlist.tracks or ()))
+        if track_ids:
+            await self.api_service.get_tracks(track_ids[:self.max_tracks], token.access_token,
+                                              priority=Priority.BULK)
+
+    async def aclose(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._jobs.clear()
+        self._seen.clear()
@@ -0,0 +1,122 @@
+import csv
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.models.song import TRAIT_FIELDS, Song, Traits
+from app.services.song_index import SongIndex
+
+DEFAULT_LIMIT = 12
+
+FEATURES = TRAIT_FIELDS
+
+
+class RecommendationEngine:
+    """
+    Recommends songs from a local catalog without calling Spotify. The audio features of every
+    song are held in a float32 matrix, one column per feature (missing values are NaN). The
+    min_*/max_* traits and genres are resolved through a SongIndex, and candidates are ranked by
+    their weighted distance to the target_* values.
+    """
+
+    def __init__(self, songs: Optional[List[Song]] = None, weights: Optional[Dict[str, float]] = None):
+        """
+        :param songs: The catalog.
+        :param weights: Optional per-feature weights for the target distance; missing features weigh 1.
+        """
+        self.features = list(FEATURES)
+        self.columns = {feature: i for i, feature in enumerate(self.features)}
+        self.weights = np.array([(weights or {}).get(feature, 1.0) for feature in self.features],
+                                dtype=np.float32)
+        self.load(songs or [])
+
+    def __len__(self):
+        return len(self.songs)
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "RecommendationEngine":
+        """
+        Load a catalog from a CSV file whose header uses the Song field names, such as the
+        public 30000 Spotify songs dataset.
+        """
+        fields = Song.model_fields
+        with open(path, newline="", encoding="utf-8") as f:
+            songs = [
+                Song(**{name: value for name, value in row.items() if name in fields and value != ""})
+                for row in csv.DictReader(f)
+            ]
+        return cls(songs, **kwargs)
+
+    def load(self, songs: List[Song]):
+        """Replace the catalog and rebuild the feature matrix and its indexes."""
+        self.songs = []
+        self.index = SongIndex(self.features)
+        self.low = np.full(len(self.features), np.nan, dtype=np.float32)
+        self.high = np.full(len(self.features), np.nan, dtype=np.float32)
+        self.add(songs, rebuild=True)
+
+    def add(self, songs: List[Song], rebuild: bool = False):
+        """Add songs to the catalog. They can be recommended right away."""
+        songs = list(songs)
+        rows = np.array(
+            [[np.nan if getattr(song, field) is None else getattr(song, field) for field in FEATURES.values()]
+             for song in songs],
+            dtype=np.float32
+        ).reshape(len(songs), len(self.features))
+        labels = [(song.playlist_genre, song.playlist_subgenre) for song in songs]
+
+        self.songs.extend(songs)
+        if rebuild:
+            self.index.build(np.concatenate([self.index.matrix, rows]), self.index.labels + labels)
+        else:
+            self.index.add(rows, labels)
+
+        # Distances are measured in units of each feature's catalog range so that tempo (~100s)
+        # does not drown out danceability (0..1)
+        with warnings.catch_warnings():
+            # Columns that are NaN for every song just get a scale of 1
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if len(rows):
+                self.low = np.fmin(self.low, np.nanmin(rows, axis=0))
+                self.high = np.fmax(self.high, np.nanmax(rows, axis=0))
+        spread = self.high - self.low
+        self.scale = np.where(np.isfinite(spread) & (spread > 0), spread, 1.0).astype(np.float32)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.index.matrix
+
+    def candidates(self, traits: Traits) -> np.ndarray:
+        """Sorted row ids of the songs that satisfy every min_*/max_* trait and the genres."""
+        bounds = {feature: (getattr(traits, f"min_{feature}"), getattr(traits, f"max_{feature}"))
+                  for feature in self.features}
+        return self.index.candidates(bounds, traits.genres)
+
+    def recommend(self, traits: Traits, limit: Optional[int] = None) -> List[Song]:
+        """Return up to `limit` (default traits.limit, then 12) songs, closest to the targets first."""
+        limit = limit or traits.limit or DEFAULT_LIMIT
+        candidates = self.candidates(traits)
+        if not len(candidates):
+            return []
+
+        targets = [(column, getattr(traits, f"target_{feature}")) for feature, column in self.columns.items()]
+        targets = [(column, value) for column, value in targets if value is not None]
+        if targets:
+            columns = np.array([column for column, _ in targets])
+            values = np.array([value for _, value in targets], dtype=np.float32)
+            diff = (self.matrix[np.ix_(candidates, columns)] - values) / self.scale[columns]
+            # A song missing a targeted feature counts as a full range away on that feature
+            diff = np.where(np.isnan(diff), 1.0, diff)
+            score = (diff * diff) @ self.weights[columns]
+        else:
+            # No targets: prefer popular songs
+            popularity = self.matrix[candidates, self.columns["popularity"]]
+            score = -np.nan_to_num(popularity, nan=-1.0)
+
+        if limit < len(candidates):
+            top = np.argpartition(score, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(score[top], kind="stable")]
+        return [self.songs[i] for i in candidates[top]]
@@ -1,29 +1,38 @@
 from framework.services.service_factory import BaseServiceFactory
+from app.config import SPOTIFY_CLIENT_ID as client_id, SPOTIFY_CLIENT_SECRET as client_secret, \
+    SONG_CATALOG_PATH as song_catalog_path
+from app.services.prefetcher import LibraryPrefetcher
 from app.services.spotify_api import SpotifyAPIService
-import dotenv, os
-
-dotenv.load_dotenv()
-client_id = os.getenv('SPOTIFY_CLIENT_ID') 
-client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
+from app.services.spotify_client import SpotifyClient
+from app.services.token_manager import SpotifyTokenManager
 
 
 class ServiceFactory(BaseServiceFactory):
 
+    services = ("SpotifyAPIService", "SpotifyTokenManager")
+
     def __init__(self):
         super().__init__()
 
     @classmethod
-    def get_service(cls, service_name):
-
-        # match service_name:
-        #     case "SpotifyAPIService":
-        #         result = SpotifyAPIService(client_id, client_secret)
-        #
-        #     case _:
-        #         result = None
+    def create_service(cls, service_name):
 
         if service_name == "SpotifyAPIService":
-            result = SpotifyAPIService(client_id, client_secret)
+            result = SpotifyAPIService(client_id, client_secret, SpotifyClient.from_env(app_id=client_id),
+                                       engine=cls.get_service("RecommendationEngine"))
+
+        elif service_name == "RecommendationEngine":
+            result = None
+            if song_catalog_path:
+                # Imported here so numpy is only loaded when there is a catalog to index
+                from app.services.recommendation_engine import RecommendationEngine
+                result = RecommendationEngine.from_csv(song_catalog_path)
+
+        elif service_name == "SpotifyTokenManager":
+            result = SpotifyTokenManager(cls.get_service("SpotifyAPIService"))
+
+        elif service_name == "LibraryPrefetcher":
+            result = LibraryPrefetcher(cls.get_service("SpotifyAPIService"))
 
         else:
             result = None
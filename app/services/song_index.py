@@ -0,0 +1,165 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SongIndex:
+    """
+    In-memory indexes over a song feature matrix, so filtered catalog queries do not scan every
+    row:
+
+    * an inverted index from genre/subgenre label to a sorted array of row ids,
+    * for each feature column, the row ids sorted by value, for searchsorted range queries.
+
+    candidates() plans each query by estimating how many rows every predicate matches (which is
+    cheap: posting lengths and two binary searches per range), materializes the most selective
+    one and only probes the matrix for the remaining predicates on the surviving rows.
+
+    Rows added with add() are appended to the matrix right away and scanned directly until the
+    next rebuild(), which happens on its own once they exceed `rebuild_ratio` of the catalog.
+    """
+
+    def __init__(self, features: List[str], rebuild_ratio: float = 0.1, min_rebuild: int = 1024):
+        self.features = list(features)
+        self.columns = {feature: i for i, feature in enumerate(self.features)}
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self.build(np.empty((0, len(self.features)), dtype=np.float32), [])
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def build(self, matrix: np.ndarray, labels: Sequence[Iterable[str]]):
+        """
+        Index a feature matrix from scratch. `labels` holds, for each row, the genre labels it
+        should be found under (e.g. its genre and subgenre).
+        """
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.labels = [self._normalize(row_labels) for row_labels in labels]
+        self.rebuild()
+
+    def add(self, rows: np.ndarray, labels: Sequence[Iterable[str]]) -> np.ndarray:
+        """Append rows and return their ids. They are searchable immediately."""
+        start = len(self.matrix)
+        self.matrix = np.concatenate([self.matrix, np.asarray(rows, dtype=np.float32).reshape(-1, len(self.features))])
+        self.labels.extend(self._normalize(row_labels) for row_labels in labels)
+
+        pending = len(self.matrix) - self.indexed
+        if pending >= max(self.min_rebuild, self.rebuild_ratio * self.indexed):
+            self.rebuild()
+        return np.arange(start, len(self.matrix))
+
+    def rebuild(self):
+        """Fold every row into the sorted structures."""
+        postings: Dict[str, List[int]] = {}
+        for row, row_labels in enumerate(self.labels):
+            for label in row_labels:
+                postings.setdefault(label, []).append(row)
+        self.postings = {label: np.array(rows, dtype=np.int64) for label, rows in postings.items()}
+
+        # Per feature: row ids ordered by value, and the values in that order. NaNs are left out,
+        # so rows without a value never satisfy a bound on that feature.
+        self.order = []
+        self.sorted_values = []
+        for column in range(len(self.features)):
+            values = self.matrix[:, column]
+            rows = np.flatnonzero(~np.isnan(values))
+            rows = rows[np.argsort(values[rows], kind="stable")]
+            self.order.append(rows)
+            self.sorted_values.append(values[rows])
+
+        self.indexed = len(self.matrix)
+
+    def candidates(self,
+                   bounds: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+                   genres: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Sorted ids of the rows with every bounded feature in [low, high] (either end may be None)
+        and, if `genres` is given, at least one of those labels.
+        """
+        bounds = {feature: bound for feature, bound in (bounds or {}).items()
+                  if bound[0] is not None or bound[1] is not None}
+        genres = list(self._normalize(genres)) if genres else None
+
+        # (estimated rows, kind, argument) for every predicate
+        plan = []
+        for feature, (low, high) in bounds.items():
+            column = self.columns[feature]
+            lo, hi = self._range(column, low, high)
+            plan.append((max(0, hi - lo), "range", (column, low, high, lo, hi)))
+        if genres is not None:
+            postings = [self.postings[genre] for genre in genres if genre in self.postings]
+            plan.append((sum(len(p) for p in postings), "genre", postings))
+        plan.sort(key=lambda step: step[0])
+
+        if not plan:
+            return np.arange(len(self.matrix))
+
+        # Materialize the most selective predicate from its index
+        _, kind, argument = plan[0]
+        if kind == "range":
+            column, _, _, lo, hi = argument
+            rows = np.sort(self.order[column][lo:hi])
+        else:
+            rows = self._union(argument)
+
+        # Probe the rest on the surviving rows only
+        for _, kind, argument in plan[1:]:
+            if not len(rows):
+                break
+            if kind == "range":
+                rows = rows[self._in_range(self.matrix[rows, argument[0]], argument[1], argument[2])]
+            else:
+                rows = rows[self._in_postings(rows, argument)]
+
+        # Rows added since the last rebuild are checked directly
+        if self.indexed < len(self.matrix):
+            pending = np.arange(self.indexed, len(self.matrix))
+            keep = np.ones(len(pending), dtype=bool)
+            for feature, (low, high) in bounds.items():
+                keep &= self._in_range(self.matrix[pending, self.columns[feature]], low, high)
+            if genres is not None:
+                wanted = set(genres)
+                keep &= np.array([not wanted.isdisjoint(self.labels[row]) for row in pending], dtype=bool)
+            rows = np.concatenate([rows, pending[keep]])
+
+        return rows
+
+    def _range(self, column: int, low: Optional[float], high: Optional[float]) -> Tuple[int, int]:
+        values = self.sorted_values[column]
+        # Bounds are rounded to the matrix dtype like the stored values, so a bound equal to a
+        # song's value includes it (searchsorted would otherwise compare in float64)
+        lo = np.searchsorted(values, values.dtype.type(low), side="left") if low is not None else 0
+        hi = np.searchsorted(values, values.dtype.type(high), side="right") if high is not None else len(values)
+        return int(lo), int(hi)
+
+    @staticmethod
+    def _in_range(values: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        keep = np.ones(len(values), dtype=bool)
+        if low is not None:
+            keep &= values >= values.dtype.type(low)
+        if high is not None:
+            keep &= values <= values.dtype.type(high)
+        return keep
+
+    @staticmethod
+    def _in_postings(rows: np.ndarray, postings: List[np.ndarray]) -> np.ndarray:
+        """Which of `rows` appear in any of the sorted postings, by binary search."""
+        keep = np.zeros(len(rows), dtype=bool)
+        for posting in postings:
+            if len(posting):
+                found = np.searchsorted(posting, rows)
+                keep |= posting[np.minimum(found, len(posting) - 1)] == rows
+        return keep
+
+    @staticmethod
+    def _union(postings: List[np.ndarray]) -> np.ndarray:
+        if not postings:
+            return np.empty(0, dtype=np.int64)
+        if len(postings) == 1:
+            return postings[0]
+        return np.unique(np.concatenate(postings))
+
+    @staticmethod
+    def _normalize(labels: Optional[Iterable[str]]) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(label.lower() for label in labels or () if label))
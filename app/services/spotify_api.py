@@ -1,28 +1,143 @@
 import os
-import requests
+import asyncio
 import base64
-from typing import Optional, List
+import hashlib
+import itertools
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Hashable, Optional, List, Union
 import random
 
+import httpx
 import jwt
 from fastapi import FastAPI, HTTPException, Request
-from pydantic import ValidationError
-import dotenv
+from pydantic import TypeAdapter, ValidationError
 
+from app.config import JWT_SECRET
 from app.models.user import User
 from app.models.spotify_token import SpotifyToken
-from app.models.playlist import Playlist
+from app.models.playlist import Playlist, CreatedPlaylist, TrackChunkResult
 from app.models.song import Song, Traits
+from app.models.spotify import adapters, user_adapter, search_adapter, tracks_adapter, playlist_page_adapter, \
+    playlist_tracks_page_adapter
+from app.services.spotify_client import SpotifyClient
+from app.services.token_manager import SpotifyAppTokenManager
+from app.utils.responses import FastJSONResponse
+from framework.middleware.metrics import STATS
+from framework.utils.cache import LRUCache, SizedLRUCache, StaleWhileRevalidateCache
+from framework.utils.rate_limit import Priority
+
+if TYPE_CHECKING:
+    # numpy is only imported when a song catalog is configured
+    from app.services.recommendation_engine import RecommendationEngine
 
-dotenv.load_dotenv()
-JWT_SECRET = os.getenv('JWT_SECRET')
 ALGORITHM = "HS256"
 
+# Spotify caps /me/playlists at 50 items per page and playlist tracks at 100
+PLAYLISTS_PAGE_SIZE = 50
+TRACKS_PAGE_SIZE = 100
+PLAYLIST_CONCURRENCY = int(os.getenv('SPOTIFY_PLAYLIST_CONCURRENCY', 10))
+
+# Track ids of each playlist are kept with its snapshot_id, which only changes when the playlist
+# does, and pages of a user's playlist index are revalidated with their ETag
+PLAYLIST_CACHE_SIZE = int(os.getenv('PLAYLIST_CACHE_SIZE', 20000))
+PLAYLIST_CACHE_BYTES = int(os.getenv('PLAYLIST_CACHE_BYTES', 64 * 1024 * 1024))
+PLAYLIST_CACHE_TTL = float(os.getenv('PLAYLIST_CACHE_TTL', 7 * 24 * 3600))
+ETAG_CACHE_SIZE = int(os.getenv('ETAG_CACHE_SIZE', 4096))
+
+# Spotify accepts at most 100 tracks per insert
+TRACKS_PER_INSERT = 100
+INSERT_CONCURRENCY = int(os.getenv('SPOTIFY_INSERT_CONCURRENCY', 4))
+INSERT_RETRIES = int(os.getenv('SPOTIFY_INSERT_RETRIES', 3))
+# Transport errors raised before a request reached Spotify, so retrying cannot apply it twice
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# /v1/tracks resolves at most 50 ids per call; resolved tracks are cached locally
+TRACKS_PER_LOOKUP = 50
+TRACKS_CONCURRENCY = int(os.getenv('SPOTIFY_TRACKS_CONCURRENCY', 20))
+TRACK_CACHE_SIZE = int(os.getenv('TRACK_CACHE_SIZE', 50000))
+TRACK_CACHE_TTL = float(os.getenv('TRACK_CACHE_TTL', 24 * 3600))
+
+# Verified JWTs are kept until they expire; tokens without `exp` are re-verified after this many seconds
+TOKEN_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 4096))
+TOKEN_CACHE_TTL = float(os.getenv('JWT_CACHE_TTL', 300))
+
+# Search results are shared by every caller asking for the same traits
+RECOMMENDATION_CACHE_TTL = float(os.getenv('RECOMMENDATION_CACHE_TTL', 300))
+RECOMMENDATION_CACHE_STALE_TTL = float(os.getenv('RECOMMENDATION_CACHE_STALE_TTL', 600))
+RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', 2048))
+RECOMMENDATION_CACHE_BYTES = int(os.getenv('RECOMMENDATION_CACHE_BYTES', 32 * 1024 * 1024))
+
+# Spotify search returns at most 50 items per page; genres slower than the deadline are dropped
+DEFAULT_RECOMMENDATION_LIMIT = 12
+SEARCH_PAGE_SIZE = 50
+RECOMMENDATION_SEARCH_DEADLINE = float(os.getenv('RECOMMENDATION_SEARCH_DEADLINE', 2.0))
+# Filtered searches page further into the results, up to this many pages per request; Spotify
+# does not return results past offset 1000
+RECOMMENDATION_PAGE_BUDGET = int(os.getenv('RECOMMENDATION_PAGE_BUDGET', 10))
+SEARCH_MAX_OFFSET = 1000
+# The only traits search results carry real values for; bounds on the others (tempo,
+# danceability, ...) cannot be checked against Spotify data and are ignored
+SEARCH_TRAIT_FIELDS = ("track_popularity", "duration_ms")
+
+# Largest number of queries in one recommendation batch, and how many of them run at once
+RECOMMENDATION_BATCH_SIZE = int(os.getenv('RECOMMENDATION_BATCH_SIZE', 100))
+RECOMMENDATION_BATCH_CONCURRENCY = int(os.getenv('RECOMMENDATION_BATCH_CONCURRENCY', 8))
+
 class SpotifyAPIService:
 
-    def __init__(self, client_id, client_secret):
+    def __init__(self, client_id, client_secret, http_client: Optional[SpotifyClient] = None,
+                 engine: Optional["RecommendationEngine"] = None):
         self.client_id = client_id
         self.client_secret = client_secret
+        self.http = http_client if http_client is not None else SpotifyClient.from_env()
+        self.engine = engine
+
+        # The Basic auth header for the token endpoint never changes, so encode it once
+        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        self.basic_auth = f"Basic {auth_header}"
+        # Client-credentials token shared by catalog calls
+        self.app_token = SpotifyAppTokenManager(self)
+
+        self.token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+        self.track_cache = LRUCache(maxsize=TRACK_CACHE_SIZE, ttl=TRACK_CACHE_TTL)
+        self.recommendation_cache = StaleWhileRevalidateCache(
+            ttl=RECOMMENDATION_CACHE_TTL,
+            stale_ttl=RECOMMENDATION_CACHE_STALE_TTL,
+            maxsize=RECOMMENDATION_CACHE_SIZE,
+            maxbytes=RECOMMENDATION_CACHE_BYTES,
+            sizeof=lambda result: sum(len(song.model_dump_json(exclude_none=True)) for song in result[0])
+        )
+
+        self.playlist_cache = SizedLRUCache(
+            maxsize=PLAYLIST_CACHE_SIZE,
+            maxbytes=PLAYLIST_CACHE_BYTES,
+            # Roughly what a tuple of 22-character id strings takes in memory
+            sizeof=lambda entry: 80 * len(entry[1]),
+            ttl=PLAYLIST_CACHE_TTL
+        )
+        self.etag_cache = LRUCache(maxsize=ETAG_CACHE_SIZE, ttl=PLAYLIST_CACHE_TTL)
+
+        # Exported on /metrics when scraped
+        STATS.register("cache", "token_cache", self.token_cache.stats)
+        STATS.register("cache", "track_cache", self.track_cache.stats)
+        STATS.register("cache", "recommendation_cache", self.recommendation_cache.stats)
+        STATS.register("cache", "playlist_cache", self.playlist_cache.stats)
+        STATS.register("cache", "etag_cache", self.etag_cache.stats)
+        STATS.register("single_flight", "spotify", lambda: {"calls": self.http.flights.calls,
+                                                            "shared": self.http.flights.shared})
+        if self.http.scheduler is not None:
+            STATS.register("rate_limiter", "spotify", self.http.scheduler.stats)
+
+    async def aclose(self):
+        await self.app_token.aclose()
+        await self.http.aclose()
+
+    def warm(self):
+        """Build the schemas and serializers the routes use, so the first request does not pay for them."""
+        for adapter in adapters:
+            adapter.warm()
+        Traits()
+        FastJSONResponse([Song()])
 
     def validate_token(self, token: str, id: Optional[str]=None, scope: Optional[tuple[str, str]]=None) -> bool:
         """Validate a JWT token.
@@ -30,23 +145,46 @@ class SpotifyAPIService:
         Optionally checks if the token's user ID matches the given ID, and
         if the token has the required scope for the endpoint.
         Scope is of the form ("/endpoint", "METHOD").
+
+        Verified tokens are cached by digest until their `exp`, so repeat
+        validations skip the signature check.
         """
+        claims = self._verify_token(token)
+        if claims is None:
+            return False
+
+        subject, scopes = claims
+        if id is not None and subject != id:
+            return False
+        if scope is not None and scope[1] not in scopes.get(scope[0], ()):
+            return False
+        return True
+
+    def _verify_token(self, token: str) -> Optional[tuple[Optional[str], dict]]:
+        """Return (subject, {endpoint: methods}) for a valid token, or None."""
+        key = hashlib.sha256(token.encode()).digest()
+        claims = self.token_cache.get(key)
+        if claims is not None:
+            return claims
+
         try:
             payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-            if id is not None and payload.get("sub") != id:
-                return False
-            if scope is not None and scope[1] not in payload.get("scopes").get(scope[0]):
-                return False
-            return True
-
         except jwt.exceptions.InvalidTokenError:
-            return False
+            return None
 
-    def login(self, auth_code, redirect_uri) -> SpotifyToken:
-        url = "https://accounts.spotify.com/api/token"
+        # Methods may be a list, or a string such as "GET" or "GET,POST" that is matched by containment
+        scopes = {
+            endpoint: methods if isinstance(methods, str) else frozenset(methods or ())
+            for endpoint, methods in (payload.get("scopes") or {}).items()
+        }
+        claims = (payload.get("sub"), scopes)
 
-        # Prepare the authorization header (Base64 encoded client_id:client_secret)
-        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        exp = payload.get("exp")
+        self.token_cache.set(key, claims, ttl=exp - time.time() if exp is not None else None)
+        return claims
+
+    async def login(self, auth_code, redirect_uri) -> SpotifyToken:
+        url = "https://accounts.spotify.com/api/token"
 
         # Prepare the POST data for the token request
         token_data = {
@@ -56,13 +194,13 @@ class SpotifyAPIService:
         }
 
         headers = {
-            'Authorization': f'Basic {auth_header}',
+            'Authorization': self.basic_auth,
             'Content-Type': 'application/x-www-form-urlencoded'
         }
 
         # Send a POST request to Spotify to exchange the authorization code for tokens
         try:
-            response = requests.post(url, data=token_data, headers=headers)
+            response = await self.http.post(url, data=token_data, headers=headers)
             if response.status_code != 200:
                 raise HTTPException(status_code=response.status_code, detail="Failed to retrieve token")
 
@@ -71,16 +209,15 @@ class SpotifyAPIService:
             token = SpotifyToken.parse_obj(data)
             return token
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise HTTPException(status_code=500, detail=f"Error fetching token: {str(e)}")
 
 
-    def refresh_token(self, token: SpotifyToken) -> SpotifyToken:
+    async def refresh_token(self, token: SpotifyToken) -> SpotifyToken:
         url = "https://accounts.spotify.com/api/token"
-        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
         headers = {
             "Content-Type": "application/x-www-form-urlencoded",
-            "Authorization": f"Basic {auth_header}"
+            "Authorization": self.basic_auth
         }
 
         data = {
@@ -89,7 +226,7 @@ class SpotifyAPIService:
         }
 
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = await self.http.post(url, data=data, headers=headers)
             if response.status_code != 200:
                 raise HTTPException(status_code=response.status_code, detail="Failed to refresh token")
 
@@ -97,10 +234,45 @@ class SpotifyAPIService:
             response["refresh_token"] = token.refresh_token
             return SpotifyToken.parse_obj(response)
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise HTTPException(status_code=500, detail=f"Error refreshing token: {str(e)}")
 
-    def get_user_info(self, token: SpotifyToken) -> User:
+    async def client_credentials_token(self) -> tuple[str, int]:
+        """Request an app token (not tied to any user) and return it with its lifetime in seconds."""
+        url = "https://accounts.spotify.com/api/token"
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Authorization": self.basic_auth
+        }
+
+        try:
+            response = await self.http.post(url, data={"grant_type": "client_credentials"}, headers=headers)
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail="Failed to retrieve app token")
+
+            data = response.json()
+            return data["access_token"], int(data.get("expires_in", 3600))
+
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=500, detail=f"Error fetching app token: {str(e)}")
+
+    async def _catalog_headers(self, spotify_access_token: Optional[str] = None) -> dict:
+        """Authorization for catalog calls: the shared app token, or the caller's token if we cannot get one."""
+        token = None
+        if self.client_id and self.client_secret:
+            try:
+                token = await self.app_token.get_access_token()
+            except Exception:
+                if spotify_access_token is None:
+                    raise
+        token = token or spotify_access_token
+        if token is None:
+            raise HTTPException(status_code=401, detail="No Spotify token available for catalog requests")
+        return {
+            "Authorization": f"Bearer {token}"
+        }
+
+    async def get_user_info(self, token: SpotifyToken) -> User:
         url = "https://api.spotify.com/v1/me"
         headers = {
             "Authorization": f"Bearer {token.access_token}"
@@ -108,15 +280,12 @@ class SpotifyAPIService:
 
         # Send a GET request to the Spotify API
         try:
-            response = requests.get(url, headers=headers)
+            response, user_data = await self.http.get_json(url, headers=headers, adapter=user_adapter)
 
             # Check if the request was successful
             if response.status_code != 200:
                 raise Exception(f"Failed to fetch user info: {response.status_code} - {response.text}")
 
-            # Parse the JSON response
-            user_data = response.json()
-
             # Map the relevant fields to your User model
             user = User(
                 id=user_data.get("id"),
@@ -130,42 +299,178 @@ class SpotifyAPIService:
 
             return user
 
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(f"An error occurred while fetching user info: {str(e)}")
 
 
-    def get_user_playlists(self, token: SpotifyToken) -> List[Playlist]:
+    async def get_user_playlists(self, token: SpotifyToken, concurrency: Optional[int] = None,
+                                 user_id: Optional[str] = None) -> List[Playlist]:
+        """Fetch every playlist of the user together with all of its track ids.
+
+        Pages of /me/playlists are followed in order, and each playlist's track pages are fetched
+        as soon as the playlist is seen, with at most `concurrency` playlists in flight at once.
+
+        Only playlists whose snapshot_id changed since they were last fetched have their tracks
+        fetched again, and index pages are revalidated with If-None-Match (per `user_id` when
+        given, else per access token), so a repeat load costs about one call per index page.
+        """
         url = "https://api.spotify.com/v1/me/playlists"
         headers = {
             "Authorization": f"Bearer {token.access_token}"
         }
+        semaphore = asyncio.Semaphore(concurrency or PLAYLIST_CONCURRENCY)
 
-        # Send a GET request to the Spotify API
         try:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise Exception(f"Failed to fetch user playlists: {response.status_code} - {response.text}")
-
-            # Parse the JSON response
-            playlists = []
-            items = response.json().get("items")
-            for item in items:
-                playlist = Playlist.parse_obj(item)
-                if not playlist:
-                    print("No playlist found")
-                    return []
-                track_info = requests.get(item.get("tracks").get("href"), headers=headers)
-                print(track_info)
-                for track in track_info.json().get("items"):
-                    playlist.tracks.append(track.get("track").get("id"))
-
-            return playlists
-
-        except requests.RequestException as e:
+            tasks = []
+            params = {"limit": PLAYLISTS_PAGE_SIZE}
+            while url:
+                data = await self._get_page(url, headers, params, "Failed to fetch user playlists",
+                                            adapter=playlist_page_adapter, etag_key=user_id or token.access_token)
+                for item in data.get("items") or []:
+                    if item:
+                        tasks.append(asyncio.create_task(self._get_playlist(item, headers, semaphore)))
+                url = data.get("next")
+                params = None
+
+            return list(await asyncio.gather(*tasks))
+
+        except httpx.HTTPError as e:
             raise Exception(f"An error occurred while fetching user playlists: {str(e)}")
 
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    def create_playlist(self, user_id: str, token: SpotifyToken, name: str, song_ids: List[str], public: bool = False):
+    async def iter_user_playlists(self, token: SpotifyToken, concurrency: Optional[int] = None,
+                                  user_id: Optional[str] = None) -> AsyncIterator[Playlist]:
+        """Like get_user_playlists, but yield each playlist as soon as its tracks are fetched.
+
+        Playlists come out in completion order, and nothing is kept once it has been yielded. At
+        most twice `concurrency` playlists are started but not yet consumed, so a slow reader
+        holds back the fetching instead of letting finished playlists pile up in memory.
+        """
+        url = "https://api.spotify.com/v1/me/playlists"
+        headers = {
+            "Authorization": f"Bearer {token.access_token}"
+        }
+        concurrency = concurrency or PLAYLIST_CONCURRENCY
+        semaphore = asyncio.Semaphore(concurrency)
+        # Released once the consumer asks for the playlist after the one it was given
+        unconsumed = asyncio.Semaphore(2 * concurrency)
+        finished = asyncio.Queue()
+        tasks = set()
+
+        async def list_playlists():
+            next_url, params = url, {"limit": PLAYLISTS_PAGE_SIZE}
+            while next_url:
+                data = await self._get_page(next_url, headers, params, "Failed to fetch user playlists",
+                                            adapter=playlist_page_adapter, etag_key=user_id or token.access_token)
+                for item in data.get("items") or []:
+                    if item:
+                        await unconsumed.acquire()
+                        task = asyncio.create_task(self._get_playlist(item, headers, semaphore))
+                        task.add_done_callback(finished.put_nowait)
+                        tasks.add(task)
+                next_url, params = data.get("next"), None
+
+        lister = asyncio.create_task(list_playlists())
+        lister.add_done_callback(finished.put_nowait)
+        listing = True
+
+        try:
+            while listing or tasks:
+                task = await finished.get()
+                if task is lister:
+                    listing = False
+                    task.result()
+                else:
+                    tasks.discard(task)
+                    yield task.result()
+                    unconsumed.release()
+
+        except httpx.HTTPError as e:
+            raise Exception(f"An error occurred while fetching user playlists: {str(e)}")
+
+        finally:
+            lister.cancel()
+            for task in tasks:
+                task.cancel()
+
+    async def _get_page(self, url: str, headers: dict, params: Optional[dict], error: str,
+                        priority: int = Priority.INTERACTIVE, adapter: Optional[TypeAdapter] = None,
+                        etag_key: Optional[Hashable] = None) -> dict:
+        """GET one page. With an `etag_key`, the page is revalidated against the copy cached under it."""
+        cached = None
+        if etag_key is not None:
+            cache_key = (etag_key, str(httpx.URL(url).copy_merge_params(params or {})))
+            cached = self.etag_cache.get(cache_key)
+            if cached is not None:
+                headers = {**headers, "If-None-Match": cached[0]}
+
+        response, data = await self.http.get_json(url, headers=headers, params=params, priority=priority,
+                                                  adapter=adapter)
+        if response.status_code == 304 and cached is not None:
+            return cached[1]
+        if response.status_code == 401:
+            # A rejected app token is replaced on the next catalog call
+            self.app_token.invalidate(headers.get("Authorization"))
+        if response.status_code != 200:
+            raise Exception(f"{error}: {response.status_code} - {response.text}")
+
+        etag = response.headers.get("ETag")
+        if etag_key is not None and etag:
+            self.etag_cache.set(cache_key, (etag, data))
+        return data
+
+    async def _get_playlist(self, item: dict, headers: dict, semaphore: asyncio.Semaphore) -> Playlist:
+        """Assemble a Playlist from a simplified playlist object, following every page of its tracks.
+
+        The track ids are reused from the playlist cache when the snapshot_id has not changed.
+        """
+        snapshot_id = item.get("snapshot_id")
+        cached = self.playlist_cache.get(item.get("id")) if snapshot_id else None
+        if cached is not None and cached[0] == snapshot_id:
+            track_ids = list(cached[1])
+        else:
+            track_ids = []
+            async with semaphore:
+                url = item.get("tracks").get("href")
+                params = {"limit": TRACKS_PAGE_SIZE, "fields": "items(track(id)),next"}
+                while url:
+                    data = await self._get_page(url, headers, params, "Failed to fetch playlist tracks", Priority.BULK,
+                                                adapter=playlist_tracks_page_adapter)
+                    for track in data.get("items") or []:
+                        # Local files and removed tracks come back without a track object or id
+                        if track and track.get("track") and track["track"].get("id"):
+                            track_ids.append(track["track"]["id"])
+                    url = data.get("next")
+                    params = None
+            if snapshot_id:
+                self.playlist_cache.set(item.get("id"), (snapshot_id, tuple(track_ids)))
+
+        images = item.get("images")
+        return Playlist(
+            id=item.get("id"),
+            name=item.get("name"),
+            description=item.get("description"),
+            owner_id=item.get("owner").get("id"),
+            image_url=images[0].get("url") if images else None,
+            snapshot_id=snapshot_id,
+            tracks=track_ids
+        )
+
+
+    async def create_playlist(self, user_id: str, token: SpotifyToken, name: str, song_ids: List[str],
+                              public: bool = False, ordered: bool = True,
+                              concurrency: Optional[int] = None) -> CreatedPlaylist:
+        """Create a playlist and add the songs in chunks of at most 100 tracks.
+
+        Spotify applies each insert to the playlist as it is at that moment, so concurrent inserts
+        at explicit positions race each other. With `ordered` (the default) chunks are therefore
+        added one after another at their final positions; with `ordered=False` up to
+        `concurrency` chunks are in flight at once and the playlist order is not guaranteed.
+        Each chunk is retried on its own, so a transient failure does not lose the playlist.
+        """
         headers = {
             "Authorization": f"Bearer {token.access_token}"
         }
@@ -178,98 +483,317 @@ class SpotifyAPIService:
                 "public": public,
                 "description": "Playlist from Subwoofer"
             }
-            print(f"Creating playlist: {body}, {user_id}")
-            response = requests.post(url, headers=headers, json=body)
+            response = await self.http.post(url, headers=headers, json=body)
             if response.status_code != 201:
                 raise Exception(f"Failed to create playlist: {response.status_code} - {response.text}")
 
             data = response.json()
-            playlist_id = data.get("id")
+            playlist = CreatedPlaylist(id=data.get("id"), snapshot_id=data.get("snapshot_id"))
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise Exception(f"An error occurred while creating the playlist: {str(e)}")
 
         # Add the songs to the playlist
+        url = f"https://api.spotify.com/v1/playlists/{playlist.id}/tracks"
+        uris = [f"spotify:track:{song_id}" for song_id in song_ids]
+        chunks = [(position, uris[position:position + TRACKS_PER_INSERT])
+                  for position in range(0, len(uris), TRACKS_PER_INSERT)]
+        semaphore = asyncio.Semaphore(concurrency or INSERT_CONCURRENCY)
+
+        async def add_chunk(position: int, chunk: List[str]) -> tuple[TrackChunkResult, Optional[str]]:
+            if ordered:
+                return await self._add_tracks(url, headers, chunk, position)
+            async with semaphore:
+                return await self._add_tracks(url, headers, chunk, position, explicit=False)
+
+        if ordered:
+            # Each chunk starts when the previous one has landed, so its position is valid
+            tasks = []
+        else:
+            tasks = [asyncio.create_task(add_chunk(position, chunk)) for position, chunk in chunks]
+
+        added = 0
         try:
-            url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-            body = {
-                "uris": [f"spotify:track:{song_id}" for song_id in song_ids]
-            }
-            response = requests.post(url, headers=headers, json=body)
-            if response.status_code != 201:
-                raise Exception(f"Failed to add songs to the playlist: {response.status_code} - {response.text}")
-
+            for i, (position, chunk) in enumerate(chunks):
+                timing, snapshot_id = await (tasks[i] if tasks else add_chunk(position, chunk))
+                playlist.chunks.append(timing)
+                playlist.snapshot_id = snapshot_id or playlist.snapshot_id
+                added += timing.size
+
+        except HTTPException:
+            raise
         except Exception as e:
-            raise Exception(f"An error occurred while adding songs to the playlist: {str(e)}")
+            raise Exception(f"An error occurred while adding songs to the playlist {playlist.id} "
+                            f"after {added} of {len(uris)} tracks were added: {str(e)}")
 
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    def get_recommendations(self, traits: Traits, spotify_access_token: str) -> List[Song]:
-        # Unfortunately, Spotify just decided to remove the recommendations endpoint from their API. So we have to use this workaround:
-        url = "https://api.spotify.com/v1/search?"
-        headers = {
-            "Authorization": f"Bearer {spotify_access_token}"
-        }
-        traits = traits.model_dump()
-        genres = traits["genres"]
-        # q = "".join(["genre:" + g + "%20OR" for g in genres])
-        # q = q[:-5]
-        q = "genre:" + genres[0]
-        url += f"q={q}&type=track&limit=12"
+        return playlist
 
-        try:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise Exception(f"Failed to fetch recommendations: {response.status_code}")
-
-            recommendations = response.json().get("tracks").get("items")
-            songs = []
-            for track in recommendations:
-                song = Song(
-                    track_id=track.get("id"),
-                    track_name=track.get("name"),
-                    track_artist=track.get("artists")[0].get("name"),
-                    track_popularity=track.get("popularity"),
-                    track_album_id=track.get("album").get("id"),
-                    track_album_name=track.get("album").get("name"),
-                    track_album_release_date=track.get("album").get("release_date"),
-                    tempo=round(random.uniform(95, 130), 3), # Spotify stopped providing tempo data, so we have to use dummy data
-                    danceability=round(random.uniform(0.3, 0.9), 3), # Spotify stopped providing danceability as well, so again we have to use dummy data
-                    duration_ms=track.get("duration_ms")
-                )
-                songs.append(song)
-            return songs
+    async def _add_tracks(self, url: str, headers: dict, uris: List[str], position: int,
+                          explicit: bool = True) -> tuple[TrackChunkResult, Optional[str]]:
+        """Add one chunk of tracks, retrying transient failures. Returns its timing and snapshot_id.
 
-        except Exception as e:
-            raise Exception(f"An error occurred while fetching song recommendations: {str(e)}")
-
-        # OLD:
-        url = "https://api.spotify.com/v1/recommendations?"
-        headers = {
-            "Authorization": f"Bearer {spotify_access_token}"
-        }
-        traits = traits.model_dump()
-        for param in traits:
-            if isinstance(traits[param], list):
-                url += f"{param}={'%2'.join(traits[param])}&"
-            elif traits[param] is not None:
-                url += f"{param}={traits[param]}&"
-        url = url[:-1]
+        The chunk is inserted at `position` when `explicit`, otherwise appended. Adding tracks is
+        not idempotent, so only failures where Spotify cannot have applied the chunk are retried:
+        503s and errors raised before the request was sent (429s are retried by SpotifyClient).
+        Anything else that happens after sending, such as a timeout, a dropped connection, or a
+        500, 502 or 504, may have added the chunk already, so it fails the chunk instead of
+        retrying and possibly adding it twice.
+        """
+        body = {"uris": uris}
+        if explicit:
+            body["position"] = position
+
+        start = time.perf_counter()
+        for attempt in range(1, INSERT_RETRIES + 2):
+            try:
+                response = await self.http.post(url, headers=headers, json=body, priority=Priority.BULK)
+                if response.status_code == 201:
+                    timing = TrackChunkResult(position=position, size=len(uris), attempts=attempt,
+                                              seconds=round(time.perf_counter() - start, 4))
+                    return timing, response.json().get("snapshot_id")
+                error = f"Failed to add songs to the playlist: {response.status_code} - {response.text}"
+                if response.status_code >= 500 and response.status_code != 503:
+                    raise Exception(f"{error}, they may have been added")
+                if response.status_code != 503:
+                    raise Exception(error)
+            except UNSENT_ERRORS as e:
+                error = str(e)
+            except httpx.HTTPError as e:
+                raise Exception(f"Failed to add songs to the playlist, they may have been added: {e!r}")
+
+            if attempt <= INSERT_RETRIES:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+        raise Exception(error)
+
+    async def get_tracks(self, ids: List[str], spotify_access_token: Optional[str] = None,
+                         market: Optional[str] = None, priority: int = Priority.INTERACTIVE) -> List[Song]:
+        """Resolve track ids to Songs, in the order given.
+
+        Duplicate ids are looked up once, ids already in the track cache are served locally, and
+        the rest are fetched from /v1/tracks in concurrent batches of 50, with the app token
+        (`spotify_access_token` is only used when no app token can be had). Unknown ids are skipped.
+        """
+        ids = list(dict.fromkeys(track_id for track_id in ids if track_id))
+        songs = {}
+        missing = []
+        for track_id in ids:
+            song = self.track_cache.get((track_id, market))
+            if song is not None:
+                songs[track_id] = song
+            else:
+                missing.append(track_id)
+
+        if missing:
+            headers = await self._catalog_headers(spotify_access_token)
+            semaphore = asyncio.Semaphore(TRACKS_CONCURRENCY)
+
+            async def get_batch(batch: List[str]) -> List[dict]:
+                params = {"ids": ",".join(batch)}
+                if market:
+                    params["market"] = market
+                async with semaphore:
+                    data = await self._get_page("https://api.spotify.com/v1/tracks", headers, params,
+                                                "Failed to fetch tracks", priority, adapter=tracks_adapter)
+                return data.get("tracks") or []
+
+            try:
+                batches = await asyncio.gather(*[get_batch(missing[i:i + TRACKS_PER_LOOKUP])
+                                                 for i in range(0, len(missing), TRACKS_PER_LOOKUP)])
+            except httpx.HTTPError as e:
+                raise Exception(f"An error occurred while fetching tracks: {str(e)}")
+
+            for batch in batches:
+                for track in batch:
+                    if track and track.get("id"):
+                        song = self._to_song(track)
+                        songs[track["id"]] = song
+                        self.track_cache.set((track["id"], market), song)
+
+        return [songs[track_id] for track_id in ids if track_id in songs]
+
+    @staticmethod
+    def _to_song(track: dict, **extra) -> Song:
+        """Map a Spotify track object to a Song. `extra` sets fields Spotify does not provide."""
+        artists = track.get("artists")
+        album = track.get("album") or {}
+        return Song(
+            track_id=track.get("id"),
+            track_name=track.get("name"),
+            track_artist=artists[0].get("name") if artists else None,
+            track_popularity=track.get("popularity"),
+            track_album_id=album.get("id"),
+            track_album_name=album.get("name"),
+            track_album_release_date=album.get("release_date"),
+            duration_ms=track.get("duration_ms"),
+            **extra
+        )
+
+    async def get_recommendations(self, traits: Traits, spotify_access_token: Optional[str] = None) -> List[Song]:
+        """Return songs matching the traits.
+
+        With a local catalog loaded, the recommendation engine answers directly. Otherwise Spotify
+        search results are served from the result cache when possible.
+        """
+        if self.engine is not None and len(self.engine):
+            return self.engine.recommend(traits)
+
+        songs, _ = await self.recommendation_cache.get_or_load(
+            traits.cache_key(),
+            lambda: self._search_recommendations(traits, spotify_access_token),
+            # Results missing a genre that timed out are returned, but not cached
+            store_if=lambda result: result[1]
+        )
+        return list(songs)
+
+    async def get_recommendations_batch(self, queries: List[Traits], spotify_access_token: Optional[str] = None,
+                                        concurrency: Optional[int] = None) -> List[Union[List[Song], Exception]]:
+        """Run many recommendation queries concurrently, returning for each one its songs or the
+        exception it raised, in the order given.
+
+        Equivalent queries (same Traits.cache_key()) run once, and at most `concurrency` run at a
+        time; all of them go through the recommendation cache.
+        """
+        semaphore = asyncio.Semaphore(concurrency or RECOMMENDATION_BATCH_CONCURRENCY)
+
+        async def run(traits: Traits) -> List[Song]:
+            async with semaphore:
+                return await self.get_recommendations(traits, spotify_access_token)
+
+        unique = {}
+        for traits in queries:
+            unique.setdefault(traits.cache_key(), traits)
+        outcomes = await asyncio.gather(*[run(traits) for traits in unique.values()], return_exceptions=True)
+        by_key = dict(zip(unique, outcomes))
+        return [by_key[traits.cache_key()] for traits in queries]
+
+    async def _search_recommendations(self, traits: Traits,
+                                      spotify_access_token: Optional[str] = None) -> tuple[List[Song], bool]:
+        """Search the requested genres for `traits.limit` songs that satisfy the min_*/max_* traits.
+
+        Each genre pages through /v1/search with `offset`, one page at a time, and every page is
+        filtered (on SEARCH_TRAIT_FIELDS, the features search results carry) and deduplicated as
+        it arrives. Pages stop as soon as the genres have collected enough songs between them; the
+        work is split evenly across the genres that still have results, and rebalanced when one
+        runs dry. At most RECOMMENDATION_PAGE_BUDGET pages are fetched, and genres still searching
+        after RECOMMENDATION_SEARCH_DEADLINE seconds are dropped as long as some song has
+        qualified. Returns the songs, interleaved across genres, and whether the search ran to
+        completion (no genre failed or timed out).
+        """
+        # Unfortunately, Spotify just decided to remove the recommendations endpoint from their API. So we have to use this workaround:
+        genres = list(dict.fromkeys(traits.genres or []))
+        if not genres:
+            raise HTTPException(status_code=400, detail="At least one genre is required")
+        limit = traits.limit or DEFAULT_RECOMMENDATION_LIMIT
+        bounds = traits.bounds(SEARCH_TRAIT_FIELDS)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RECOMMENDATION_SEARCH_DEADLINE
+        results = {genre: [] for genre in genres}
+        offsets = dict.fromkeys(genres, 0)
+        finished = set()        # genres without further results, or that failed
+        seen = set()
+        errors = []
+        pages = 0
+
+        async def fill(genre: str, share: int):
+            """Page through one genre until it contributed `share` more songs."""
+            nonlocal pages
+            found = 0
+            while found < share and genre not in finished and pages < RECOMMENDATION_PAGE_BUDGET:
+                pages += 1
+                # Without filters every result counts, so ask for no more than is missing
+                size = SEARCH_PAGE_SIZE if bounds else min(SEARCH_PAGE_SIZE, share - found)
+                songs, more = await self._search_genre(genre, size, spotify_access_token, offsets[genre],
+                                                       traits.market)
+                offsets[genre] += size
+                if not more or offsets[genre] + size > SEARCH_MAX_OFFSET:
+                    finished.add(genre)
+                for song in songs:
+                    if song.track_id not in seen and self._within(song, bounds):
+                        seen.add(song.track_id)
+                        results[genre].append(song)
+                        found += 1
+
+        timed_out = False
+        while len(seen) < limit and pages < RECOMMENDATION_PAGE_BUDGET:
+            active = [genre for genre in genres if genre not in finished]
+            if not active:
+                break
+            share = -(-(limit - len(seen)) // len(active))
+            tasks = {asyncio.create_task(fill(genre, share)): genre for genre in active}
+            try:
+                done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+                # Past the deadline, wait only until some song has qualified
+                while pending and not seen:
+                    more, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    done |= more
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            for task in done:
+                if task.exception() is not None:
+                    errors.append(task.exception())
+                    finished.add(tasks[task])
+            if pending:
+                timed_out = True
+                break
+
+        if not seen and errors:
+            if isinstance(errors[0], HTTPException):
+                raise errors[0]
+            raise Exception(f"An error occurred while fetching song recommendations: {str(errors[0])}")
+
+        # Round-robin across genres so each one is represented
+        songs = [song for batch in itertools.zip_longest(*results.values()) for song in batch if song is not None]
+        return songs[:limit], not timed_out and not errors
+
+    @staticmethod
+    def _within(song: Song, bounds: dict) -> bool:
+        """Whether the song satisfies every bound on the features it has a value for."""
+        for field, (low, high) in bounds.items():
+            value = getattr(song, field)
+            if value is None:
+                continue
+            if (low is not None and value < low) or (high is not None and value > high):
+                return False
+        return True
 
-        try:
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise Exception(f"Failed to fetch recommendations: {response.status_code}")
-
-            recommendations = response.json()
-            songs = []
-            for track in recommendations.get("tracks"):
-                song = Song(
-                    id=track.get("id"),
-                    name=track.get("name"),
-                    artists=[artist.get("name") for artist in track.get("artists")],
-                )
-                songs.append(song)
-            return songs
+    async def _search_genre(self, genre: str, limit: int, spotify_access_token: Optional[str] = None,
+                            offset: int = 0, market: Optional[str] = None) -> tuple[List[Song], bool]:
+        """One page of tracks of a genre, and whether there are more after it.
 
-        except Exception as e:
-            raise Exception(f"An error occurred while fetching song recommendations: {str(e)}")
+        If Spotify rejects the app token (e.g. it was revoked), the token is dropped and the page
+        requested once more with a new one.
+        """
+        params = {"q": f"genre:{genre}", "type": "track", "limit": limit, "offset": offset}
+        if market:
+            params["market"] = market
+        for _ in range(2):
+            headers = await self._catalog_headers(spotify_access_token)
+            response, data = await self.http.get_json("https://api.spotify.com/v1/search", headers=headers,
+                                                      params=params, adapter=search_adapter)
+            if response.status_code != 401 or not self.app_token.invalidate(headers.get("Authorization")):
+                break
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch recommendations: {response.status_code}")
+
+        page = data.get("tracks") or {}
+        songs = []
+        for track in page.get("items") or []:
+            if not track:
+                continue
+            song = self._to_song(
+                track,
+                tempo=round(random.uniform(95, 130), 3), # Spotify stopped providing tempo data, so we have to use dummy data
+                danceability=round(random.uniform(0.3, 0.9), 3), # Spotify stopped providing danceability as well, so again we have to use dummy data
+            )
+            songs.append(song)
+        return songs, bool(page.get("next"))
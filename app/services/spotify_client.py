@@ -0,0 +1,207 @@
+import os
+import math
+import time
+import asyncio
+from typing import Any, Optional
+
+import httpx
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+
+from app.utils.metrics import UPSTREAM_ERRORS, UPSTREAM_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_RESPONSE_SIZE, \
+    UPSTREAM_THROTTLED, endpoint_label
+from framework.utils.rate_limit import Priority, RequestScheduler
+from framework.utils.single_flight import SingleFlight
+
+try:
+    import h2  # noqa: F401 -- only needed so httpx can negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class SpotifyClient:
+    """
+    Async HTTP client shared by every call to the Spotify API. A single instance keeps a pool
+    of keep-alive connections (HTTP/2 when the h2 package is installed), so routes can await
+    many upstream calls concurrently without paying a new TCP+TLS handshake for each one.
+
+    When given a RequestScheduler, every request first takes a token from it, in priority order,
+    and 429/503 answers pause the scheduler for the Retry-After period before retrying.
+    """
+
+    def __init__(self,
+                 max_connections: int = 100,
+                 max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0,
+                 timeout: float = 10.0,
+                 connect_timeout: float = 5.0,
+                 http2: Optional[bool] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 scheduler: Optional[RequestScheduler] = None,
+                 max_retries: int = 3,
+                 max_retry_after: float = 30.0):
+        """
+        :param max_connections: Maximum number of open connections across all hosts.
+        :param max_keepalive_connections: Maximum number of idle connections kept in the pool.
+        :param keepalive_expiry: Seconds an idle connection stays in the pool.
+        :param timeout: Default read/write/pool timeout in seconds.
+        :param connect_timeout: Timeout in seconds for establishing a connection.
+        :param http2: Force HTTP/2 on or off. Defaults to on when h2 is installed.
+        :param transport: Optional transport override, e.g. httpx.MockTransport for tests.
+        :param scheduler: Optional rate-limit scheduler shared by every client of the same app.
+        :param max_retries: How many times a throttled request is retried.
+        :param max_retry_after: Longest Retry-After, in seconds, worth waiting for before giving up.
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.flights = SingleFlight()
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_env(cls, app_id: Optional[str] = None, **kwargs) -> "SpotifyClient":
+        """
+        Build a client using the SPOTIFY_HTTP_* environment variables, falling back to the
+        constructor defaults for anything that is not set. With an `app_id` (the Spotify
+        client_id) the client is throttled by that app's shared SPOTIFY_RATE_LIMIT bucket.
+        """
+        env = {
+            "max_connections": ("SPOTIFY_HTTP_MAX_CONNECTIONS", int),
+            "max_keepalive_connections": ("SPOTIFY_HTTP_MAX_KEEPALIVE", int),
+            "keepalive_expiry": ("SPOTIFY_HTTP_KEEPALIVE_EXPIRY", float),
+            "timeout": ("SPOTIFY_HTTP_TIMEOUT", float),
+            "connect_timeout": ("SPOTIFY_HTTP_CONNECT_TIMEOUT", float),
+            "max_retries": ("SPOTIFY_MAX_RETRIES", int),
+            "max_retry_after": ("SPOTIFY_MAX_RETRY_AFTER", float),
+        }
+        for arg, (name, cast) in env.items():
+            value = os.getenv(name)
+            if value is not None and arg not in kwargs:
+                kwargs[arg] = cast(value)
+
+        http2 = os.getenv("SPOTIFY_HTTP2")
+        if http2 is not None and "http2" not in kwargs:
+            kwargs["http2"] = http2.lower() in ("1", "true", "yes")
+
+        if app_id is not None and "scheduler" not in kwargs:
+            kwargs["scheduler"] = RequestScheduler.for_key(
+                app_id,
+                rate=float(os.getenv("SPOTIFY_RATE_LIMIT", 10)),
+                capacity=float(os.getenv("SPOTIFY_RATE_BURST", 30))
+            )
+
+        return cls(**kwargs)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        The underlying httpx client, created on first use so it binds to the running event loop.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+                transport=self._transport
+            )
+        return self._client
+
+    async def request(self, method: str, url: str, priority: int = Priority.INTERACTIVE,
+                      **kwargs) -> httpx.Response:
+        """
+        Send a request, waiting for the rate limiter first. Raises HTTPException(429) when Spotify
+        keeps throttling after `max_retries` attempts or asks for a longer wait than we allow.
+        """
+        endpoint = endpoint_label(str(url))
+        for attempt in range(self.max_retries + 1):
+            if self.scheduler is not None:
+                await self.scheduler.acquire(priority)
+
+            response = await self._send(method, url, endpoint, **kwargs)
+            throttled = response.status_code == 429 or \
+                (response.status_code == 503 and "Retry-After" in response.headers)
+            if not throttled:
+                return response
+
+            UPSTREAM_THROTTLED(method, endpoint).inc()
+
+            retry_after = self._retry_after(response, attempt)
+            if attempt == self.max_retries or retry_after > self.max_retry_after:
+                break
+
+            if self.scheduler is not None:
+                # Pausing the shared bucket holds back every queued call, not just this one
+                self.scheduler.backoff(retry_after)
+            else:
+                await asyncio.sleep(retry_after)
+
+        if response.status_code == 429:
+            raise HTTPException(status_code=429, detail="Spotify rate limit exceeded",
+                                headers={"Retry-After": str(math.ceil(retry_after))})
+        return response
+
+    async def _send(self, method: str, url: str, endpoint: str, **kwargs) -> httpx.Response:
+        # Timed after the rate limiter, so the latency is Spotify's and not our own queueing
+        start = time.perf_counter()
+        UPSTREAM_IN_FLIGHT.inc()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            UPSTREAM_ERRORS(method, endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            UPSTREAM_IN_FLIGHT.dec()
+
+        UPSTREAM_LATENCY(method, endpoint, str(response.status_code)).observe(time.perf_counter() - start)
+        UPSTREAM_RESPONSE_SIZE(method, endpoint).observe(len(response.content))
+        return response
+
+    @staticmethod
+    def _retry_after(response: httpx.Response, attempt: int) -> float:
+        try:
+            return max(0.0, float(response.headers["Retry-After"]))
+        except (KeyError, ValueError):
+            # No usable header: exponential backoff starting at half a second
+            return 0.5 * 2 ** attempt
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def get_json(self, url: str, headers: Optional[dict] = None, params: Optional[dict] = None,
+                       adapter: Optional[TypeAdapter] = None, **kwargs) -> tuple[httpx.Response, Any]:
+        """
+        GET a JSON resource and return (response, parsed body), with the body None unless the
+        status is 200. With an `adapter` the body is validated straight from the response bytes
+        into the adapter's type. Concurrent calls for the same URL, Authorization and If-None-Match
+        headers and adapter share one upstream request and one parsed body, so callers must treat
+        the body as read-only.
+        """
+        headers = headers or {}
+        key = (str(httpx.URL(url).copy_merge_params(params or {})), headers.get("Authorization"),
+               headers.get("If-None-Match"), id(adapter))
+        return await self.flights.do(
+            key, lambda: self._get_json(url, adapter, headers=headers, params=params, **kwargs))
+
+    async def _get_json(self, url: str, adapter: Optional[TypeAdapter], **kwargs) -> tuple[httpx.Response, Any]:
+        response = await self.get(url, **kwargs)
+        data = None
+        if response.status_code == 200 and response.content:
+            data = adapter.validate_json(response.content) if adapter is not None else response.json()
+        return response, data
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,258 @@
+import os
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.models.spotify_token import SpotifyToken
+from framework.middleware.metrics import STATS
+from framework.utils.single_flight import SingleFlight
+
+# Refresh this many seconds before a token expires
+REFRESH_MARGIN = float(os.getenv('SPOTIFY_TOKEN_REFRESH_MARGIN', 120))
+# Tokens are only refreshed in the background for users seen this recently; others are refreshed
+# on their next request. Users not seen for TOKEN_EVICT_AFTER are forgotten, and at most
+# TOKEN_MAX_USERS are held, least recently seen evicted first.
+TOKEN_IDLE_TIMEOUT = float(os.getenv('SPOTIFY_TOKEN_IDLE_TIMEOUT', 3600))
+TOKEN_EVICT_AFTER = float(os.getenv('SPOTIFY_TOKEN_EVICT_AFTER', 7 * 24 * 3600))
+TOKEN_MAX_USERS = int(os.getenv('SPOTIFY_TOKEN_MAX_USERS', 10000))
+
+
+class SpotifyTokenManager:
+    """
+    Keeps each user's Spotify token in memory, keyed by Spotify user id, and refreshes it in the
+    background shortly before it expires while the user is active. Concurrent refreshes for the
+    same user share a single call to the token endpoint, so routes can ask for a valid token
+    without a client round trip.
+    """
+
+    def __init__(self, api_service,
+                 refresh_margin: float = REFRESH_MARGIN,
+                 idle_timeout: float = TOKEN_IDLE_TIMEOUT,
+                 evict_after: float = TOKEN_EVICT_AFTER,
+                 max_users: int = TOKEN_MAX_USERS,
+                 clock=time.time):
+        """
+        :param api_service: The SpotifyAPIService used to refresh tokens.
+        :param refresh_margin: Seconds before expiry at which a token is refreshed.
+        :param idle_timeout: Seconds since a user was last seen after which their token is no
+            longer refreshed in the background.
+        :param evict_after: Seconds since a user was last seen after which their token is dropped.
+        :param max_users: Most users whose tokens are held.
+        :param clock: Wall-clock time source, overridable for tests.
+        """
+        self.api_service = api_service
+        self.refresh_margin = refresh_margin
+        self.idle_timeout = idle_timeout
+        self.evict_after = evict_after
+        self.max_users = max_users
+        self.clock = clock
+        self.refreshes = 0
+        self.evictions = 0
+        self._tokens = {}               # user id -> (SpotifyToken, expires_at)
+        self._seen = OrderedDict()      # user id -> last time seen, least recent first
+        self._timers = {}               # user id -> background refresh task
+        self._flights = SingleFlight()
+        STATS.register("tokens", "user", self.stats)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._tokens
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def store(self, user_id: str, token: SpotifyToken):
+        """
+        Remember a freshly issued token and schedule its refresh. `expires_in` is counted from now.
+        """
+        expires_at = self.clock() + token.expires_in
+        self._tokens[user_id] = (token, expires_at)
+        self._touch(user_id)
+        self._schedule(user_id, expires_at)
+        self._evict()
+
+    def forget(self, user_id: str):
+        self._tokens.pop(user_id, None)
+        self._seen.pop(user_id, None)
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def expires_at(self, user_id: str) -> Optional[float]:
+        entry = self._tokens.get(user_id)
+        return entry[1] if entry else None
+
+    async def get_token(self, user_id: str) -> Optional[SpotifyToken]:
+        """
+        Return a token for the user that is valid for at least `refresh_margin` more seconds,
+        refreshing it first if needed, or None if we hold no token for the user. Its `expires_in`
+        is the time left, not the lifetime it was issued with.
+        """
+        entry = self._tokens.get(user_id)
+        if entry is None:
+            return None
+        if self._idle_for(user_id) > self.evict_after:
+            self.forget(user_id)
+            self.evictions += 1
+            return None
+        self._touch(user_id)
+
+        token, expires_at = entry
+        if expires_at - self.clock() <= self.refresh_margin:
+            token = await self.refresh(user_id)
+            entry = self._tokens.get(user_id)
+            if token is None or entry is None or entry[0] is not token:
+                return token
+            expires_at = entry[1]
+        return token.model_copy(update={"expires_in": max(0, int(expires_at - self.clock()))})
+
+    async def get_access_token(self, user_id: str) -> Optional[str]:
+        token = await self.get_token(user_id)
+        return token.access_token if token else None
+
+    async def refresh(self, user_id: str) -> Optional[SpotifyToken]:
+        """Refresh the user's token now. Concurrent calls for one user share a single refresh."""
+        return await self._flights.do(user_id, lambda: self._refresh(user_id))
+
+    async def _refresh(self, user_id: str) -> Optional[SpotifyToken]:
+        entry = self._tokens.get(user_id)
+        if entry is None:
+            return None
+
+        self.refreshes += 1
+        token = await self.api_service.refresh_token(entry[0])
+        # The user may have logged in again (or been forgotten) while we were waiting; keep the
+        # newer token then
+        if self._tokens.get(user_id) is entry:
+            expires_at = self.clock() + token.expires_in
+            self._tokens[user_id] = (token, expires_at)
+            self._schedule(user_id, expires_at)
+            return token
+        entry = self._tokens.get(user_id)
+        return entry[0] if entry else token
+
+    def _touch(self, user_id: str):
+        self._seen[user_id] = self.clock()
+        self._seen.move_to_end(user_id)
+
+    def _idle_for(self, user_id: str) -> float:
+        return self.clock() - self._seen.get(user_id, self.clock())
+
+    def _evict(self):
+        """Drop the least recently seen users while over `max_users` or idle past `evict_after`."""
+        while self._seen:
+            user_id, seen_at = next(iter(self._seen.items()))
+            if len(self._tokens) <= self.max_users and self.clock() - seen_at <= self.evict_after:
+                break
+            self.forget(user_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._tokens),
+            "scheduled": len(self._timers),
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+        }
+
+    def _schedule(self, user_id: str, expires_at: float):
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. a script): tokens are then refreshed lazily by get_token()
+            return
+        self._timers[user_id] = loop.create_task(self._refresh_later(user_id, expires_at))
+
+    async def _refresh_later(self, user_id: str, expires_at: float):
+        await asyncio.sleep(max(0.0, expires_at - self.refresh_margin - self.clock()))
+        self._timers.pop(user_id, None)
+        self._evict()
+        if user_id not in self._tokens or self._idle_for(user_id) > self.idle_timeout:
+            # Not worth the rate-limit budget; get_token() refreshes it if the user comes back
+            return
+        try:
+            await self.refresh(user_id)
+        except Exception:
+            # A token we cannot refresh is useless; the user has to log in again
+            self.forget(user_id)
+
+    async def aclose(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._tokens.clear()
+        self._seen.clear()
+
+
+class SpotifyAppTokenManager:
+    """
+    Holds the app's own client-credentials token, which catalog calls (search, tracks) use
+    instead of user tokens, so they share one token, one rate-limit budget and the same
+    single-flight keys across users. Once the token is within `refresh_margin` of expiring it
+    is refreshed in the background while callers keep using it; callers only wait when there is
+    no valid token at all.
+    """
+
+    def __init__(self, api_service, refresh_margin: float = REFRESH_MARGIN, clock=time.time):
+        """
+        :param api_service: The SpotifyAPIService used to request tokens.
+        :param refresh_margin: Seconds before expiry at which the token is refreshed.
+        :param clock: Wall-clock time source, overridable for tests.
+        """
+        self.api_service = api_service
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.refreshes = 0
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._flights = SingleFlight()
+
+    async def get_access_token(self) -> str:
+        now = self.clock()
+        if self._token is not None and self._expires_at > now:
+            if self._expires_at - now <= self.refresh_margin:
+                self._refresh_soon()
+            return self._token
+        return await self.refresh()
+
+    async def refresh(self) -> str:
+        """Request a new token now. Concurrent calls share a single request."""
+        return await self._flights.do("app", self._refresh)
+
+    def invalidate(self, authorization: Optional[str]) -> bool:
+        """
+        Drop the token if Spotify rejected it, given the Authorization header that was sent.
+        Returns whether that header carried the current app token.
+        """
+        if self._token is not None and authorization == f"Bearer {self._token}":
+            self._token = None
+            return True
+        return False
+
+    async def _refresh(self) -> str:
+        self.refreshes += 1
+        token, expires_in = await self.api_service.client_credentials_token()
+        self._token, self._expires_at = token, self.clock() + expires_in
+        return token
+
+    def _refresh_soon(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.get_running_loop().create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception:
+            # The current token is still valid; the next caller inside the margin tries again
+            pass
+
+    async def aclose(self):
+        if self._refreshing is not None:
+            self._refreshing.cancel()
+            self._refreshing = None
+        self._token = None
@@ -0,0 +1,42 @@
+from functools import lru_cache
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from framework.middleware.metrics import SIZE_BUCKETS, LabelCache
+
+# Latency, status and payload size of every call we make to Spotify, per endpoint template
+UPSTREAM_LATENCY = LabelCache(Histogram(
+    "spotify_request_duration_seconds", "Time spent waiting for Spotify API responses",
+    ["method", "endpoint", "status"],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+UPSTREAM_RESPONSE_SIZE = LabelCache(Histogram(
+    "spotify_response_size_bytes", "Size of Spotify API response bodies", ["method", "endpoint"],
+    buckets=SIZE_BUCKETS))
+UPSTREAM_ERRORS = LabelCache(Counter(
+    "spotify_request_errors_total", "Spotify API calls that failed without a response",
+    ["method", "endpoint", "error"]))
+UPSTREAM_THROTTLED = LabelCache(Counter(
+    "spotify_throttled_total", "Spotify API answers asking us to back off (429/503 with Retry-After)",
+    ["method", "endpoint"]))
+UPSTREAM_IN_FLIGHT = Gauge("spotify_requests_in_flight", "Spotify API calls currently awaiting a response")
+
+# Path segments following these are ids, and are collapsed so the endpoint label stays bounded
+ID_PARENTS = {"albums", "artists", "audio-features", "playlists", "tracks", "users"}
+ENDPOINT_PATHS = {"me", "playlists", "tracks", "images", "followers"}
+
+
+@lru_cache(maxsize=4096)
+def endpoint_label(url: str) -> str:
+    """
+    The templated path of a Spotify URL, e.g. /v1/playlists/{id}/tracks for
+    https://api.spotify.com/v1/playlists/37i9dQZF1DXcBWIGoYBM5M/tracks?offset=100.
+    """
+    path = url.split("://", 1)[-1]
+    path = "/" + path.split("/", 1)[1] if "/" in path else "/"
+    path = path.split("?", 1)[0]
+
+    segments = path.split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_PARENTS and segments[i] and segments[i] not in ENDPOINT_PATHS:
+            segments[i] = "{id}"
+    return "/".join(segments)
@@ -0,0 +1,40 @@
+from functools import lru_cache
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(list[model])
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for the hot routes. Return it from a route instead of the models themselves
+    and FastAPI skips its response-model validation and jsonable_encoder pass. A model, or a list
+    of models of one type, is serialized by pydantic-core straight to bytes, leaving out None
+    fields unless exclude_none=False; anything else is rendered with orjson.
+    """
+
+    def __init__(self, content: Any, exclude_none: bool = True, **kwargs):
+        self.exclude_none = exclude_none
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content, exclude_none=self.exclude_none)
+
+        if isinstance(content, list) and content and isinstance(content[0], BaseModel):
+            model = type(content[0])
+            if all(type(item) is model for item in content):
+                return _list_adapter(model).dump_json(content, exclude_none=self.exclude_none)
+
+        return orjson.dumps(content, default=self._default)
+
+    def _default(self, value: Any) -> Any:
+        if isinstance(value, BaseModel):
+            return value.model_dump(mode="json", exclude_none=self.exclude_none)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
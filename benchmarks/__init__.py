@@ -0,0 +1,12 @@
+import os
+import subprocess
+from typing import Optional
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked out commit, to name and label results."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
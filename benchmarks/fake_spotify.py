@@ -0,0 +1,274 @@
+#
+# A local stand-in for the parts of the Spotify Web API the adapter calls, for benchmarks.
+#
+# Every response is generated deterministically from ids, so runs are repeatable. Latency, page
+# depth, errors and 429s are configurable through FakeSpotifyConfig. The same app answers both
+# accounts.spotify.com and api.spotify.com paths, so one transport can stand in for both hosts:
+#
+#   python -m benchmarks.fake_spotify --port 9000 --latency 0.05
+#
+import argparse
+import asyncio
+import hashlib
+import random
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+GENRES = ["pop", "rock", "rap", "r&b", "latin", "edm", "jazz", "country", "indie", "metal",
+          "folk", "blues", "soul", "punk", "house", "techno", "reggae", "funk", "classical", "ambient"]
+
+
+class FakeSpotifyConfig:
+
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 playlists: int = 20,
+                 tracks_per_playlist: int = 120,
+                 search_results: int = 1000,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 retry_after: int = 1,
+                 seed: int = 0):
+        """
+        :param latency: Seconds every response is delayed by.
+        :param jitter: Up to this many extra seconds, uniformly random, on top of `latency`.
+        :param playlists: Playlists of the user; /me/playlists is paged 50 at a time.
+        :param tracks_per_playlist: Tracks in each playlist; playlist tracks are paged 100 at a time.
+        :param search_results: Total matches of every genre search.
+        :param error_rate: Share of requests answered with a 503 (without Retry-After).
+        :param throttle_rate: Share of requests answered with a 429 and Retry-After.
+        :param retry_after: Retry-After, in seconds, sent with the injected 429s.
+        :param seed: Seed of the random delays and injected failures.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.playlists = playlists
+        self.tracks_per_playlist = tracks_per_playlist
+        self.search_results = search_results
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _number(value: str, modulo: int) -> int:
+    """A stable pseudo-random number for a string."""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), "big") % modulo
+
+
+@lru_cache(maxsize=100_000)
+def track(track_id: str) -> dict:
+    return {
+        "id": track_id,
+        "name": f"Track {track_id}",
+        "artists": [{"id": f"artist{_number(track_id, 500)}", "name": f"Artist {_number(track_id, 500)}"}],
+        "album": {
+            "id": f"album{_number(track_id, 2000)}",
+            "name": f"Album {_number(track_id, 2000)}",
+            "release_date": f"{1970 + _number(track_id, 55)}-01-01",
+        },
+        "popularity": _number(track_id, 101),
+        "duration_ms": 120_000 + _number(track_id, 240_000),
+    }
+
+
+def create_app(config: Optional[FakeSpotifyConfig] = None) -> FastAPI:
+    """
+    Build the fake. `app.state.config` can be changed between runs, `app.state.calls` counts
+    the requests answered per endpoint, and access tokens added to `app.state.revoked` are
+    answered with a 401. Created playlists keep their track uris in `app.state.contents`, and
+    `app.state.insert_faults` holds (status, applied) pairs that the next inserts answer with,
+    after adding the tracks anyway when `applied`.
+    """
+    # Handlers return JSONResponse themselves so FastAPI skips jsonable_encoder and the fake
+    # stays cheap next to the adapter it is measuring
+    app = FastAPI()
+    app.state.config = config or FakeSpotifyConfig()
+    app.state.calls = Counter()
+    app.state.random = random.Random(app.state.config.seed)
+    app.state.created = 0
+    app.state.revoked = set()
+    app.state.contents = {}
+    app.state.insert_faults = []
+
+    async def inject(request: Request):
+        config = app.state.config
+        route = request.scope.get("route")
+        app.state.calls[f"{request.method} {route.path if route else request.url.path}"] += 1
+        if request.headers.get("Authorization", "").removeprefix("Bearer ") in app.state.revoked:
+            raise HTTPException(status_code=401, detail="The access token expired")
+
+        delay = config.latency + (app.state.random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        draw = app.state.random.random()
+        if draw < config.throttle_rate:
+            raise HTTPException(status_code=429, detail="API rate limit exceeded",
+                                headers={"Retry-After": str(config.retry_after)})
+        if draw < config.throttle_rate + config.error_rate:
+            raise HTTPException(status_code=503, detail="Service unavailable")
+
+    def playlist_tracks_href(request: Request, playlist_id: str) -> str:
+        return str(request.base_url.replace(path=f"/v1/playlists/{playlist_id}/tracks"))
+
+    def page_url(request: Request, offset: int, limit: int, total: int) -> Optional[str]:
+        if offset + limit >= total:
+            return None
+        return str(request.url.include_query_params(offset=offset + limit, limit=limit))
+
+    @app.post("/api/token", dependencies=[Depends(inject)])
+    async def token(request: Request):
+        # Parsed by hand so the fake does not need python-multipart
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+        grant_type = form.get("grant_type")
+        if grant_type == "authorization_code":
+            refresh_token = f"refresh-{form.get('code')}"
+        elif grant_type == "refresh_token":
+            refresh_token = form.get("refresh_token")
+        elif grant_type == "client_credentials":
+            refresh_token = None
+        else:
+            return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+
+        body = {
+            "access_token": f"access-{app.state.random.getrandbits(64):016x}",
+            "token_type": "Bearer",
+            "scope": "playlist-read-private playlist-modify-private user-read-email",
+            "expires_in": 3600,
+        }
+        if refresh_token is not None:
+            body["refresh_token"] = refresh_token
+        return JSONResponse(body)
+
+    @app.get("/v1/me", dependencies=[Depends(inject)])
+    async def me():
+        return JSONResponse({
+            "id": "benchmark-user",
+            "display_name": "Benchmark User",
+            "email": "benchmark@example.com",
+            "country": "US",
+            "images": [{"url": "https://i.scdn.co/image/benchmark"}],
+        })
+
+    @app.get("/v1/me/playlists", dependencies=[Depends(inject)])
+    async def playlists(request: Request, offset: int = 0, limit: int = 20):
+        total = app.state.config.playlists
+        # The index only changes with the configuration, so that is all its ETag depends on
+        etag = f'"{_number(f"{offset}:{limit}:{total}:{app.state.config.tracks_per_playlist}", 1 << 30)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        items = [
+            {
+                "id": f"playlist{i:05d}",
+                "name": f"Playlist {i}",
+                "description": "",
+                "owner": {"id": "benchmark-user"},
+                "images": [{"url": f"https://i.scdn.co/image/playlist{i:05d}"}],
+                "tracks": {"href": playlist_tracks_href(request, f"playlist{i:05d}"),
+                           "total": app.state.config.tracks_per_playlist},
+                "snapshot_id": f"snapshot-{i:05d}-{app.state.config.tracks_per_playlist}",
+            }
+            for i in range(offset, min(offset + limit, total))
+        ]
+        return JSONResponse({"items": items, "next": page_url(request, offset, limit, total), "total": total},
+                            headers={"ETag": etag})
+
+    @app.get("/v1/playlists/{playlist_id}/tracks", dependencies=[Depends(inject)])
+    async def playlist_tracks(request: Request, playlist_id: str, offset: int = 0, limit: int = 100):
+        total = app.state.config.tracks_per_playlist
+        items = [{"track": track(f"{playlist_id}t{i:05d}")} for i in range(offset, min(offset + limit, total))]
+        return JSONResponse({"items": items, "next": page_url(request, offset, limit, total), "total": total})
+
+    @app.get("/v1/search", dependencies=[Depends(inject)])
+    async def search(request: Request, q: str = "", type: str = "track", offset: int = 0, limit: int = 20):
+        genre = q.split("genre:", 1)[-1].strip('"')
+        total = app.state.config.search_results
+        items = [track(f"{genre}{i:06d}") for i in range(offset, min(offset + limit, total))]
+        return JSONResponse({"tracks": {"items": items, "next": page_url(request, offset, limit, total),
+                                        "total": total}})
+
+    @app.get("/v1/tracks", dependencies=[Depends(inject)])
+    async def tracks(ids: str = ""):
+        ids = [track_id for track_id in ids.split(",") if track_id]
+        if len(ids) > 50:
+            raise HTTPException(status_code=400, detail="Too many ids requested")
+        return JSONResponse({"tracks": [track(track_id) for track_id in ids]})
+
+    @app.post("/v1/users/{user_id}/playlists", status_code=201, dependencies=[Depends(inject)])
+    async def create_playlist(user_id: str, body: dict):
+        app.state.created += 1
+        app.state.contents[f"created{app.state.created:06d}"] = []
+        return JSONResponse({"id": f"created{app.state.created:06d}", "name": body.get("name"),
+                             "snapshot_id": f"snapshot-created{app.state.created:06d}-0"}, status_code=201)
+
+    @app.post("/v1/playlists/{playlist_id}/tracks", status_code=201, dependencies=[Depends(inject)])
+    async def add_tracks(playlist_id: str, body: dict):
+        uris: List[str] = body.get("uris") or []
+        if len(uris) > 100:
+            raise HTTPException(status_code=400, detail="Too many tracks requested")
+
+        fault, applied = app.state.insert_faults.pop(0) if app.state.insert_faults else (None, True)
+        contents = app.state.contents.get(playlist_id)
+        if contents is not None and applied:
+            position = body.get("position", len(contents))
+            contents[position:position] = uris
+        if fault is not None:
+            raise HTTPException(status_code=fault, detail="Injected failure")
+        return JSONResponse({"snapshot_id": f"snapshot-{playlist_id}-{app.state.random.getrandbits(32):08x}"},
+                            status_code=201)
+
+    return app
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """
+    Sends every request to `base_url` instead of its own host, keeping the path and query, so a
+    client written against accounts/api.spotify.com talks to a fake server running elsewhere.
+    """
+
+    def __init__(self, base_url: str, **kwargs):
+        self.base_url = httpx.URL(base_url)
+        self.transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        # The Host header still names the Spotify host, so `next` links look like Spotify's
+        request.url = request.url.copy_with(scheme=self.base_url.scheme, host=self.base_url.host,
+                                            port=self.base_url.port)
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def transport(app: Optional[FastAPI] = None, base_url: Optional[str] = None) -> httpx.AsyncBaseTransport:
+    """
+    A transport for SpotifyClient: to the fake server at `base_url` over real HTTP, or else to
+    `app` in-process.
+    """
+    if base_url is not None:
+        return RedirectTransport(base_url)
+    return httpx.ASGITransport(app=app)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake Spotify API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    for name, default in vars(FakeSpotifyConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+    uvicorn.run(create_app(FakeSpotifyConfig(**args)), host=host, port=port)
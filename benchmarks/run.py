@@ -0,0 +1,278 @@
+#
+# Load-test the adapter's routes against the fake Spotify API and record throughput and latency.
+#
+#   python -m benchmarks.run                                   # every scenario at 1, 8 and 32
+#   python -m benchmarks.run --scenarios tracks,recommendations --concurrency 1,64 --latency 0.05
+#   python -m benchmarks.run --baseline benchmarks/results/<older commit>.json
+#
+# The adapter runs in-process behind httpx.ASGITransport, with its SpotifyClient wired to the fake
+# (in-process too, unless --spotify-url points at one started with python -m benchmarks.fake_spotify).
+# Results are written as JSON, named after the current commit, so runs can be compared later.
+#
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import httpx
+import jwt
+
+# The adapter reads its JWT secret at import time
+os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+
+from app.main import app  # noqa: E402
+from app.services import spotify_api  # noqa: E402
+from app.services.service_factory import ServiceFactory  # noqa: E402
+from app.services.spotify_api import SpotifyAPIService  # noqa: E402
+from app.services.spotify_client import SpotifyClient  # noqa: E402
+from app.services.token_manager import SpotifyTokenManager  # noqa: E402
+from benchmarks import fake_spotify, git_commit  # noqa: E402
+from framework.utils.rate_limit import RequestScheduler  # noqa: E402
+
+USER_ID = "benchmark-user"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+# Queries per request of the recommendations_batch scenario
+BATCH_QUERIES = 20
+
+
+class Scenario:
+    """
+    One adapter route. `build(i)` returns the keyword arguments of httpx.AsyncClient.request()
+    for the i-th call, so calls can vary (e.g. to control how often caches hit).
+    """
+
+    def __init__(self, name: str, build: Callable[[int], dict], expect: int = 200):
+        self.name = name
+        self.build = build
+        self.expect = expect
+
+
+def scenarios(spotify_access_token: str) -> Dict[str, Scenario]:
+    track_pool = [f"pool{i:05d}" for i in range(2000)]
+    genre_pool = fake_spotify.GENRES
+
+    def tracks(i: int) -> dict:
+        rng = random.Random(i)
+        return {"method": "POST", "url": "/tracks",
+                "json": {"ids": rng.sample(track_pool, 120), "spotify_access_token": spotify_access_token}}
+
+    def recommendations(i: int) -> dict:
+        rng = random.Random(i)
+        return {"method": "GET", "url": "/recommendations",
+                "params": {"genres": rng.sample(genre_pool, 2), "limit": 20,
+                           "spotify_access_token": spotify_access_token}}
+
+    def recommendations_batch(i: int) -> dict:
+        # The same queries as `recommendations` makes in BATCH_QUERIES calls, in one request
+        queries = [{"genres": random.Random(j).sample(genre_pool, 2), "limit": 20}
+                   for j in range(i * BATCH_QUERIES, (i + 1) * BATCH_QUERIES)]
+        return {"method": "POST", "url": "/recommendations/batch",
+                "json": {"queries": queries, "spotify_access_token": spotify_access_token}}
+
+    return {scenario.name: scenario for scenario in [
+        Scenario("login", lambda i: {"method": "POST", "url": "/auth/login", "json": {"auth_code": f"code{i}"}},
+                 expect=201),
+        Scenario("user_playlists", lambda i: {"method": "GET", "url": f"/users/{USER_ID}/playlists"}),
+        Scenario("user_playlists_stream",
+                 lambda i: {"method": "GET", "url": f"/users/{USER_ID}/playlists", "params": {"stream": "true"}}),
+        Scenario("create_playlist",
+                 lambda i: {"method": "POST", "url": f"/users/{USER_ID}/playlists",
+                            "json": {"name": f"Benchmark {i}", "song_ids": track_pool[:250]}}),
+        Scenario("refreshed_token", lambda i: {"method": "GET", "url": f"/users/{USER_ID}/refreshed_token"}),
+        Scenario("tracks", tracks),
+        Scenario("recommendations", recommendations),
+        Scenario("recommendations_batch", recommendations_batch),
+    ]}
+
+
+def jwt_for(user_id: str) -> str:
+    """A token for the adapter itself, allowed on every route."""
+    scopes = {}
+    for route in app.routes:
+        for method in getattr(route, "methods", None) or ():
+            scopes.setdefault(route.path, []).append(method)
+    payload = {"sub": user_id, "scopes": scopes, "exp": int(time.time()) + 24 * 3600}
+    return jwt.encode(payload, spotify_api.JWT_SECRET, algorithm=spotify_api.ALGORITHM)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+async def run_level(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, requests: int,
+                    warmup: int) -> dict:
+    """Send `requests` calls with `concurrency` workers, after `warmup` unrecorded calls."""
+    for i in range(warmup):
+        await client.request(**scenario.build(-1 - i))
+
+    latencies = []
+    statuses = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.request(**scenario.build(i))
+                await response.aread()
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": requests - statuses.get(str(scenario.expect), 0),
+        "statuses": statuses,
+        "seconds": round(seconds, 4),
+        "throughput": round(requests / seconds, 2) if seconds else 0.0,
+        "latency_ms": {
+            "mean": round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else 0.0,
+            "p50": round(percentile(milliseconds, 50), 3),
+            "p90": round(percentile(milliseconds, 90), 3),
+            "p99": round(percentile(milliseconds, 99), 3),
+            "max": round(milliseconds[-1], 3) if milliseconds else 0.0,
+        },
+    }
+
+
+async def run(args) -> dict:
+    config = fake_spotify.FakeSpotifyConfig(
+        latency=args.latency, jitter=args.jitter, playlists=args.playlists,
+        tracks_per_playlist=args.tracks_per_playlist, search_results=args.search_results,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        seed=args.seed)
+    spotify = fake_spotify.create_app(config)
+
+    scheduler = None
+    if args.rate_limit:
+        scheduler = RequestScheduler.for_key("benchmark", rate=args.rate_limit, capacity=args.rate_burst)
+    http = SpotifyClient(transport=fake_spotify.transport(spotify, args.spotify_url), scheduler=scheduler)
+    api_service = SpotifyAPIService("benchmark-client", "benchmark-secret", http)
+    token_manager = SpotifyTokenManager(api_service)
+    ServiceFactory.override("SpotifyAPIService", api_service)
+    ServiceFactory.override("SpotifyTokenManager", token_manager)
+
+    headers = {"Authorization": f"Bearer {jwt_for(USER_ID)}"}
+    results = []
+    try:
+        # Unhandled errors count as 500s, as a server would answer them
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://adapter",
+                                     headers=headers, timeout=args.timeout) as client:
+            # Log in once so the token manager holds a Spotify token for the user routes
+            response = await client.post("/auth/login", json={"auth_code": "setup"})
+            response.raise_for_status()
+            spotify_access_token = response.json()["token"]["access_token"]
+
+            available = scenarios(spotify_access_token)
+            names = args.scenarios.split(",") if args.scenarios else list(available)
+            for name in names:
+                for concurrency in args.concurrency:
+                    # Every run starts from cold caches so runs are comparable
+                    api_service.track_cache.clear()
+                    api_service.recommendation_cache.clear()
+                    api_service.playlist_cache.clear()
+                    api_service.etag_cache.clear()
+                    spotify.state.calls.clear()
+
+                    result = await run_level(client, available[name], concurrency, args.requests, args.warmup)
+                    result["upstream_calls"] = dict(spotify.state.calls)
+                    results.append(result)
+                    print(format_result(result), flush=True)
+    finally:
+        ServiceFactory.clear_overrides()
+        await token_manager.aclose()
+        await api_service.aclose()
+
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "fake_spotify": config.to_dict(),
+            "spotify_url": args.spotify_url,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "rate_limit": args.rate_limit,
+            "rate_burst": args.rate_burst,
+        },
+        "results": results,
+    }
+
+
+def format_result(result: dict) -> str:
+    latency = result["latency_ms"]
+    return (f"{result['scenario']:<24} c={result['concurrency']:<4} {result['throughput']:>9.1f} req/s  "
+            f"p50 {latency['p50']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms  errors {result['errors']}")
+
+
+def compare(baseline: dict, current: dict):
+    """Print the throughput and latency change of every run also present in the baseline."""
+    before = {(result["scenario"], result["concurrency"]): result for result in baseline["results"]}
+    print(f"\nCompared with {baseline.get('commit')}:")
+    for result in current["results"]:
+        old = before.get((result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        changes = [
+            ("req/s", old["throughput"], result["throughput"]),
+            ("p50", old["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            ("p99", old["latency_ms"]["p99"], result["latency_ms"]["p99"]),
+        ]
+        print(f"{result['scenario']:<24} c={result['concurrency']:<4} " + "  ".join(
+            f"{label} {(new - previous) / previous * 100:+7.1f}%" if previous else f"{label} {'n/a':>8}"
+            for label, previous, new in changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the adapter against a fake Spotify API")
+    parser.add_argument("--scenarios", help="Comma separated scenario names (default: all)")
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda value: [int(v) for v in value.split(",")],
+                        help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests before each run")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--spotify-url", help="Use a fake Spotify server running at this URL")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Throttle Spotify calls to this many per second (default: off)")
+    parser.add_argument("--rate-burst", type=float, default=30.0)
+    for name, default in fake_spotify.FakeSpotifyConfig().to_dict().items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#
+# Measure cold starts: each run is a fresh interpreter that imports app.main, as the Lambda init
+# phase does, and then serves one request through the Mangum handler.
+#
+#   python -m benchmarks.startup --runs 20
+#   python -m benchmarks.startup --baseline benchmarks/results/startup-<older commit>.json
+#
+# Reported per run: the interpreter's wall time to import the app (init), the first invocation
+# (an authenticated route, so the services it needs are built by then), and the app's own
+# per-phase breakdown. Medians and p90s across runs are written as JSON.
+#
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import git_commit
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+path = "/users/startup/refreshed_token"
+event = {
+    "version": "2.0", "routeKey": "GET " + path, "rawPath": path, "rawQueryString": "",
+    "headers": {"host": "localhost", "authorization": "Bearer not-a-jwt"}, "isBase64Encoded": False,
+    "requestContext": {"stage": "$default",
+                       "http": {"method": "GET", "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1"}},
+}
+response = app.main.handler(event, None)
+assert response["statusCode"] == 401, response
+invoked = time.perf_counter()
+timer = getattr(app.main, "startup_timer", None)
+print(json.dumps({"import": imported - start, "first_invocation": invoked - imported,
+                  "phases": timer.phases if timer else {}}))
+"""
+
+
+def run_once(prewarm: bool) -> dict:
+    env = dict(os.environ, PREWARM="1" if prewarm else "0", PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    child = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, env=env, cwd=ROOT)
+    wall = time.perf_counter() - start
+    if child.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{child.stderr}")
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["process"] = wall
+    return result
+
+
+def summarize(runs: list) -> dict:
+    def stats(values):
+        values = sorted(values)
+        return {
+            "median_ms": round(statistics.median(values) * 1000, 3),
+            "p90_ms": round(values[min(len(values) - 1, int(0.9 * len(values)))] * 1000, 3),
+            "min_ms": round(values[0] * 1000, 3),
+        }
+
+    summary = {key: stats([run[key] for run in runs]) for key in ("process", "import", "first_invocation")}
+    summary["phases"] = {phase: stats([run["phases"].get(phase, 0.0) for run in runs])
+                         for phase in runs[0]["phases"]}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the adapter's cold start")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per mode")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/startup-<commit>.json)")
+    parser.add_argument("--baseline", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": {},
+    }
+    for mode, prewarm in (("lazy", False), ("prewarm", True)):
+        summary = summarize([run_once(prewarm) for _ in range(args.runs)])
+        report["results"][mode] = summary
+        print(f"{mode:<8} process {summary['process']['median_ms']:>8.1f} ms  "
+              f"import {summary['import']['median_ms']:>8.1f} ms  "
+              f"first invocation {summary['first_invocation']['median_ms']:>7.1f} ms")
+        for phase, stats in summary["phases"].items():
+            print(f"    {phase:<18} {stats['median_ms']:>8.1f} ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"startup-{report['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {baseline.get('commit')}:")
+        for mode, summary in report["results"].items():
+            old = baseline["results"].get(mode)
+            if old is None:
+                continue
+            print(f"{mode:<8} " + "  ".join(
+                f"{key} {(summary[key]['median_ms'] - old[key]['median_ms']) / old[key]['median_ms'] * 100:+6.1f}%"
+                for key in ("process", "import", "first_invocation") if old[key]["median_ms"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#
+# Prometheus instrumentation for ASGI applications.
+#
+# MetricsMiddleware records latency, status and payload sizes per route template (never the raw
+# path, which would create a time series per user id). STATS exports the stats() of registered
+# objects when scraped, and metrics_response() renders the registry for a /metrics endpoint.
+#
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram,
+                               generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.responses import Response
+
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class LabelCache:
+    """
+    Remembers the child of a labelled metric for each label tuple, so the hot path is a single
+    dict lookup instead of prometheus_client's labels() validation and locking.
+    """
+
+    def __init__(self, metric):
+        self.metric = metric
+        self._children = {}
+
+    def __call__(self, *labels):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = self.metric.labels(*labels)
+        return child
+
+
+REQUEST_LATENCY = LabelCache(Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests",
+    ["method", "route", "status"]))
+REQUEST_SIZE = LabelCache(Histogram(
+    "http_request_size_bytes", "Size of HTTP request bodies", ["method", "route"], buckets=SIZE_BUCKETS))
+RESPONSE_SIZE = LabelCache(Histogram(
+    "http_response_size_bytes", "Size of HTTP response bodies", ["method", "route"], buckets=SIZE_BUCKETS))
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being handled")
+EXCEPTIONS = LabelCache(Counter(
+    "http_request_exceptions_total", "HTTP requests that raised instead of responding", ["method", "route"]))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware buffering, so streaming responses stay streamed)
+    recording per-route metrics for every HTTP request.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_size, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except Exception:
+            EXCEPTIONS(scope["method"], self._route(scope)).inc()
+            raise
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            method, route = scope["method"], self._route(scope)
+            REQUEST_LATENCY(method, route, str(status)).observe(time.perf_counter() - start)
+            REQUEST_SIZE(method, route).observe(request_size)
+            RESPONSE_SIZE(method, route).observe(response_size)
+
+    @staticmethod
+    def _route(scope) -> str:
+        # FastAPI stores the matched route in the scope while routing
+        route = scope.get("route")
+        return getattr(route, "path", None) or "<unmatched>"
+
+
+class StatsCollector:
+    """
+    Exports the stats() dicts of live objects (caches, schedulers, ...) at scrape time, so the
+    objects themselves keep plain integer counters and pay nothing per operation. Every numeric
+    entry becomes a gauge named `<prefix>_<key>` labelled with the registered name; a dict entry
+    becomes one gauge with an extra `key` label per item.
+    """
+
+    def __init__(self):
+        self._sources = {}
+
+    def register(self, prefix: str, name: str, stats):
+        """
+        :param prefix: Metric name prefix, e.g. "cache".
+        :param name: Value of the `name` label, e.g. "track_cache". Registering it again replaces it.
+        :param stats: Callable returning a dict of numbers (or of dicts of numbers).
+        """
+        self._sources[(prefix, name)] = stats
+
+    def unregister(self, prefix: str, name: str):
+        self._sources.pop((prefix, name), None)
+
+    def collect(self):
+        families = {}
+        for (prefix, name), stats in list(self._sources.items()):
+            for key, value in stats().items():
+                metric = f"{prefix}_{key}"
+                if isinstance(value, dict):
+                    family = families.get(metric)
+                    if family is None:
+                        family = families[metric] = GaugeMetricFamily(metric, f"{prefix} {key}", labels=["name", "key"])
+                    for item, number in value.items():
+                        family.add_metric([name, str(item)], number)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family = families.get(metric)
+                    if family is None:
+                        family = families[metric] = GaugeMetricFamily(metric, f"{prefix} {key}", labels=["name"])
+                    family.add_metric([name], value)
+        return list(families.values())
+
+
+STATS = StatsCollector()
+REGISTRY.register(STATS)
+
+
+def metrics_response(registry=REGISTRY) -> Response:
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
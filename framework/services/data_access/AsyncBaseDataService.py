@@ -0,0 +1,66 @@
+from abc import ABC, abstractmethod
+
+
+class AsyncDataDataService(ABC):
+    """
+    Abstract base class for asyncio-native data services. It mirrors DataDataService, but every
+    database call is a coroutine, so async routes can overlap database reads with other I/O
+    instead of blocking the event loop.
+    """
+
+    def __init__(self, context):
+        """
+        This is a simple approach to dependency injection. The context will contain references
+        to configuration information that an instance needs.
+        :param context:
+        """
+        self.context = context
+
+    @abstractmethod
+    async def _get_connection(self):
+        """
+        Create and return a connection (or connection pool) to the database instance for this
+        data service.
+        :return: A connection.
+        """
+        raise NotImplementedError('Abstract method _get_connection()')
+
+    @abstractmethod
+    async def get_data_object(self,
+                              database_name: str,
+                              collection_name: str,
+                              key_field: str,
+                              key_value: str):
+        """
+        See DataDataService.get_data_object().
+        """
+        raise NotImplementedError('Abstract method get_data_object()')
+
+    @abstractmethod
+    async def get_data_objects(self,
+                               database_name: str,
+                               collection_name: str,
+                               key_field: str,
+                               key_values: list):
+        """
+        See DataDataService.get_data_objects().
+        """
+        raise NotImplementedError('Abstract method get_data_objects()')
+
+    @abstractmethod
+    async def insert_data_objects(self,
+                                  database_name: str,
+                                  collection_name: str,
+                                  data_objects: list,
+                                  upsert: bool = False):
+        """
+        See DataDataService.insert_data_objects().
+        """
+        raise NotImplementedError('Abstract method insert_data_objects()')
+
+    @abstractmethod
+    async def aclose(self):
+        """
+        Close every connection held by the data service.
+        """
+        raise NotImplementedError('Abstract method aclose()')
@@ -0,0 +1,127 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiomysql
+from .AsyncBaseDataService import AsyncDataDataService
+
+
+class AsyncMySQLRDBDataService(AsyncDataDataService):
+    """
+    The asyncio counterpart of MySQLRDBDataService, built on an aiomysql connection pool. The
+    context takes the same connection settings plus pool_size, pool_recycle and chunk_size.
+    """
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.chunk_size = context.get("chunk_size", 1000)
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_connection(self):
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.context["host"],
+                        port=self.context["port"],
+                        user=self.context["user"],
+                        password=self.context["password"],
+                        minsize=0,
+                        maxsize=self.context.get("pool_size", 10),
+                        pool_recycle=self.context.get("pool_recycle", 3600),
+                        cursorclass=aiomysql.DictCursor,
+                        autocommit=True
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def _cursor(self):
+        pool = await self._get_connection()
+        async with pool.acquire() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    yield cursor
+            except BaseException:
+                # A closed connection is dropped by the pool instead of being reused
+                connection.close()
+                raise
+
+    async def aclose(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def get_data_object(self,
+                              database_name: str,
+                              collection_name: str,
+                              key_field: str,
+                              key_value: str):
+        """
+        See base class for comments.
+        """
+
+        result = None
+
+        try:
+            sql_statement = f"SELECT * FROM {database_name}.{collection_name} " + \
+                        f"where {key_field}=%s"
+            async with self._cursor() as cursor:
+                await cursor.execute(sql_statement, [key_value])
+                result = await cursor.fetchone()
+        except Exception as e:
+            pass
+
+        return result
+
+    async def get_data_objects(self,
+                               database_name: str,
+                               collection_name: str,
+                               key_field: str,
+                               key_values: list):
+        """
+        See base class for comments. Chunks are queried concurrently on separate connections.
+        """
+
+        key_values = list(dict.fromkeys(key_values))
+
+        async def get_chunk(chunk):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            sql_statement = f"SELECT * FROM {database_name}.{collection_name} " + \
+                f"where {key_field} IN ({placeholders})"
+            async with self._cursor() as cursor:
+                await cursor.execute(sql_statement, chunk)
+                return await cursor.fetchall()
+
+        chunks = await asyncio.gather(*[get_chunk(key_values[i:i + self.chunk_size])
+                                        for i in range(0, len(key_values), self.chunk_size)])
+        return [row for chunk in chunks for row in chunk]
+
+    async def insert_data_objects(self,
+                                  database_name: str,
+                                  collection_name: str,
+                                  data_objects: list,
+                                  upsert: bool = False):
+        """
+        See base class for comments.
+        """
+
+        if not data_objects:
+            return 0
+
+        fields = list(data_objects[0].keys())
+        columns = ", ".join(f"`{field}`" for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql_statement = f"INSERT INTO {database_name}.{collection_name} ({columns}) VALUES ({placeholders})"
+        if upsert:
+            updates = ", ".join(f"`{field}`=VALUES(`{field}`)" for field in fields)
+            sql_statement += f" ON DUPLICATE KEY UPDATE {updates}"
+
+        rows = [[data_object[field] for field in fields] for data_object in data_objects]
+        count = 0
+
+        async with self._cursor() as cursor:
+            for i in range(0, len(rows), self.chunk_size):
+                count += await cursor.executemany(sql_statement, rows[i:i + self.chunk_size]) or 0
+
+        return count
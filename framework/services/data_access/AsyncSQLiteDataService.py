@@ -0,0 +1,118 @@
+import asyncio
+
+import aiosqlite
+from .AsyncBaseDataService import AsyncDataDataService
+
+
+class AsyncSQLiteDataService(AsyncDataDataService):
+    """
+    A local, file- or memory-backed stand-in for AsyncMySQLRDBDataService, meant for tests and
+    development. Each database_name is an attached SQLite database; the context maps names to
+    files with "databases" (default ":memory:" for any name not listed), and may set chunk_size.
+    SQLite serializes access anyway, so a single connection is shared by all calls.
+    """
+
+    def __init__(self, context=None):
+        super().__init__(context or {})
+        self.chunk_size = self.context.get("chunk_size", 500)
+        self._connection = None
+        self._attached = set()
+        self._lock = asyncio.Lock()
+
+    async def _get_connection(self):
+        if self._connection is None:
+            self._connection = await aiosqlite.connect(self.context.get("path", ":memory:"))
+            self._connection.row_factory = aiosqlite.Row
+        return self._connection
+
+    async def _database(self, database_name: str):
+        """Return the connection with `database_name` attached."""
+        connection = await self._get_connection()
+        if database_name not in self._attached:
+            path = self.context.get("databases", {}).get(database_name, ":memory:")
+            await connection.execute("ATTACH DATABASE ? AS " + database_name, [path])
+            self._attached.add(database_name)
+        return connection
+
+    async def execute(self, database_name: str, sql_statement: str, args=()):
+        """
+        Run a statement, e.g. CREATE TABLE, against an attached database. Table names in the
+        statement must be qualified with the database name.
+        """
+        async with self._lock:
+            connection = await self._database(database_name)
+            await connection.execute(sql_statement, args)
+            await connection.commit()
+
+    async def aclose(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+            self._attached.clear()
+
+    async def get_data_object(self,
+                              database_name: str,
+                              collection_name: str,
+                              key_field: str,
+                              key_value: str):
+        """
+        See base class for comments.
+        """
+
+        sql_statement = f"SELECT * FROM {database_name}.{collection_name} where {key_field}=?"
+        async with self._lock:
+            connection = await self._database(database_name)
+            async with connection.execute(sql_statement, [key_value]) as cursor:
+                row = await cursor.fetchone()
+
+        return dict(row) if row is not None else None
+
+    async def get_data_objects(self,
+                               database_name: str,
+                               collection_name: str,
+                               key_field: str,
+                               key_values: list):
+        """
+        See base class for comments.
+        """
+
+        key_values = list(dict.fromkeys(key_values))
+        result = []
+
+        async with self._lock:
+            connection = await self._database(database_name)
+            for i in range(0, len(key_values), self.chunk_size):
+                chunk = key_values[i:i + self.chunk_size]
+                placeholders = ", ".join(["?"] * len(chunk))
+                sql_statement = f"SELECT * FROM {database_name}.{collection_name} " + \
+                    f"where {key_field} IN ({placeholders})"
+                async with connection.execute(sql_statement, chunk) as cursor:
+                    result.extend(dict(row) for row in await cursor.fetchall())
+
+        return result
+
+    async def insert_data_objects(self,
+                                  database_name: str,
+                                  collection_name: str,
+                                  data_objects: list,
+                                  upsert: bool = False):
+        """
+        See base class for comments. Upserts use INSERT OR REPLACE.
+        """
+
+        if not data_objects:
+            return 0
+
+        fields = list(data_objects[0].keys())
+        columns = ", ".join(f'"{field}"' for field in fields)
+        placeholders = ", ".join(["?"] * len(fields))
+        verb = "INSERT OR REPLACE" if upsert else "INSERT"
+        sql_statement = f"{verb} INTO {database_name}.{collection_name} ({columns}) VALUES ({placeholders})"
+        rows = [[data_object[field] for field in fields] for data_object in data_objects]
+
+        async with self._lock:
+            connection = await self._database(database_name)
+            await connection.executemany(sql_statement, rows)
+            await connection.commit()
+
+        return len(rows)
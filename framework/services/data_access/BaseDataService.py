@@ -44,3 +44,37 @@ class DataDataService(ABC):
         """
         raise NotImplementedError('Abstract method get_data_object()')
 
+    @abstractmethod
+    def get_data_objects(self,
+                         database_name: str,
+                         collection_name: str,
+                         key_field: str,
+                         key_values: list):
+        """
+        Gets every data object whose key is in a list of values, in as few round trips as the
+        database allows.
+
+        :param database_name: Name of the database or similar abstraction.
+        :param collection_name: The name of the collection, table, etc. in the database.
+        :param key_field: A single column, field, ... that is a unique key/identifier.
+        :param key_values: The values to look up. Values with no matching object are skipped.
+        :return: A list of the matching objects, in no particular order.
+        """
+        raise NotImplementedError('Abstract method get_data_objects()')
+
+    @abstractmethod
+    def insert_data_objects(self,
+                            database_name: str,
+                            collection_name: str,
+                            data_objects: list,
+                            upsert: bool = False):
+        """
+        Inserts many data objects at once. All objects must have the same fields.
+
+        :param database_name: Name of the database or similar abstraction.
+        :param collection_name: The name of the collection, table, etc. in the database.
+        :param data_objects: A list of dicts mapping field names to values.
+        :param upsert: If True, objects whose key already exists replace the stored values.
+        :return: The number of affected objects, as reported by the database.
+        """
+        raise NotImplementedError('Abstract method insert_data_objects()')
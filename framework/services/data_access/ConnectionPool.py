@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A small, thread-safe pool of database connections. Connections are created lazily up to
+    `size`, checked before reuse when they have been idle for a while, replaced once older than
+    `recycle` seconds, and thrown away whenever the code using them raises.
+    """
+
+    def __init__(self, connect, size: int = 5, timeout: float = 30.0, recycle: float = 3600.0,
+                 check_after: float = 30.0, is_healthy=None):
+        """
+        :param connect: Function returning a new connection.
+        :param size: Maximum number of open connections.
+        :param timeout: Seconds to wait for a free connection before raising PoolTimeoutError.
+        :param recycle: Connections older than this many seconds are closed instead of reused.
+        :param check_after: Connections idle for longer than this are health-checked before reuse.
+        :param is_healthy: Function taking a connection and returning False if it is unusable.
+        """
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.check_after = check_after
+        self.is_healthy = is_healthy
+        self._idle = queue.LifoQueue()      # (connection, created_at, returned_at)
+        self._open = 0
+        self._lock = threading.Lock()
+        self._available = threading.Semaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block.
+        """
+        if not self._available.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No database connection available after {self.timeout} seconds")
+
+        try:
+            conn, created_at = self._checkout()
+        except BaseException:
+            self._available.release()
+            raise
+
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            self._available.release()
+            raise
+
+        self._idle.put((conn, created_at, time.monotonic()))
+        self._available.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, created_at, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            now = time.monotonic()
+            if now - created_at > self.recycle:
+                self._discard(conn)
+                continue
+            if self.is_healthy is not None and now - returned_at > self.check_after and not self.is_healthy(conn):
+                self._discard(conn)
+                continue
+            return conn, created_at
+
+        conn = self.connect()
+        with self._lock:
+            self._open += 1
+        return conn, time.monotonic()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._open -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {"size": self.size, "open": self._open, "idle": self._idle.qsize()}
+
+    def close(self):
+        """
+        Close every idle connection. Connections currently borrowed are closed when returned
+        with an error, or reused otherwise.
+        """
+        while True:
+            try:
+                conn, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
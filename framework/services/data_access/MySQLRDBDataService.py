@@ -1,5 +1,6 @@
 import pymysql
 from .BaseDataService import DataDataService
+from .ConnectionPool import ConnectionPool
 
 
 class MySQLRDBDataService(DataDataService):
@@ -7,10 +8,22 @@ class MySQLRDBDataService(DataDataService):
     A generic data service for MySQL databases. The class implement common
     methods from BaseDataService and other methods for MySQL. More complex use cases
     can subclass, reuse methods and extend.
+
+    Connections come from a pool shared by all calls on the instance. The context may set
+    pool_size, pool_timeout, pool_recycle and chunk_size (the most keys per IN (...) query and
+    rows per multi-row INSERT) in addition to the connection settings.
     """
 
     def __init__(self, context):
         super().__init__(context)
+        self.chunk_size = context.get("chunk_size", 1000)
+        self.pool = ConnectionPool(
+            self._get_connection,
+            size=context.get("pool_size", 5),
+            timeout=context.get("pool_timeout", 30.0),
+            recycle=context.get("pool_recycle", 3600.0),
+            is_healthy=self._is_healthy
+        )
 
     def _get_connection(self):
         connection = pymysql.connect(
@@ -23,6 +36,17 @@ class MySQLRDBDataService(DataDataService):
         )
         return connection
 
+    @staticmethod
+    def _is_healthy(connection) -> bool:
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        self.pool.close()
+
     def get_data_object(self,
                         database_name: str,
                         collection_name: str,
@@ -32,24 +56,72 @@ class MySQLRDBDataService(DataDataService):
         See base class for comments.
         """
 
-        connection = None
         result = None
 
         try:
             sql_statement = f"SELECT * FROM {database_name}.{collection_name} " + \
                         f"where {key_field}=%s"
-            connection = self._get_connection()
-            cursor = connection.cursor()
-            cursor.execute(sql_statement, [key_value])
-            result = cursor.fetchone()
+            with self.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql_statement, [key_value])
+                    result = cursor.fetchone()
         except Exception as e:
-            if connection:
-                connection.close()
+            # The pool has already discarded the connection
+            pass
+
+        return result
+
+    def get_data_objects(self,
+                         database_name: str,
+                         collection_name: str,
+                         key_field: str,
+                         key_values: list):
+        """
+        See base class for comments. Keys are looked up with one IN (...) query per chunk_size keys.
+        """
+
+        key_values = list(dict.fromkeys(key_values))
+        result = []
+
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                for i in range(0, len(key_values), self.chunk_size):
+                    chunk = key_values[i:i + self.chunk_size]
+                    placeholders = ", ".join(["%s"] * len(chunk))
+                    sql_statement = f"SELECT * FROM {database_name}.{collection_name} " + \
+                        f"where {key_field} IN ({placeholders})"
+                    cursor.execute(sql_statement, chunk)
+                    result.extend(cursor.fetchall())
 
         return result
 
+    def insert_data_objects(self,
+                            database_name: str,
+                            collection_name: str,
+                            data_objects: list,
+                            upsert: bool = False):
+        """
+        See base class for comments. Rows are sent with executemany, which pymysql turns into
+        multi-row INSERT statements; upserts use ON DUPLICATE KEY UPDATE.
+        """
 
+        if not data_objects:
+            return 0
 
+        fields = list(data_objects[0].keys())
+        columns = ", ".join(f"`{field}`" for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql_statement = f"INSERT INTO {database_name}.{collection_name} ({columns}) VALUES ({placeholders})"
+        if upsert:
+            updates = ", ".join(f"`{field}`=VALUES(`{field}`)" for field in fields)
+            sql_statement += f" ON DUPLICATE KEY UPDATE {updates}"
 
+        rows = [[data_object[field] for field in fields] for data_object in data_objects]
+        count = 0
 
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                for i in range(0, len(rows), self.chunk_size):
+                    count += cursor.executemany(sql_statement, rows[i:i + self.chunk_size]) or 0
 
+        return count
@@ -1,22 +1,105 @@
 #
-# Placeholder for implementing the service factory and service locator patterns.
+# Service factory and service locator patterns.
 #
 # https://medium.com/javarevisited/service-locator-factory-pattern-7bb9e835b709
 #
-from abc import ABC, abstractmethod
-
-# TODO -- Implement the framework.
+# Concrete factories say how to build a service in create_service(). The base class keeps the
+# instances for the lifetime of the application, so connection pools, caches and precomputed
+# credentials are shared by every request instead of rebuilt per call.
 #
+import inspect
+import threading
+from abc import ABC, abstractmethod
 
 
 class BaseServiceFactory(ABC):
 
+    # Names of the services to build eagerly in startup(). Anything else is built on first use.
+    services = ()
+
     def __init__(self):
         pass
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Each concrete factory has its own registry
+        cls._instances = {}
+        cls._overrides = {}
+        # Reentrant so create_service() can look up the services a new service depends on
+        cls._lock = threading.RLock()
+
     @classmethod
     @abstractmethod
-    def get_service(cls, service_name):
+    def create_service(cls, service_name):
+        """
+        Build a new instance of the named service, or return None if the name is unknown.
+        """
         raise NotImplementedError()
 
+    @classmethod
+    def get_service(cls, service_name):
+        """
+        Return the application-lifetime instance of the named service, creating it on first use.
+        Overrides registered with override() take precedence.
+        """
+        if service_name in cls._overrides:
+            return cls._overrides[service_name]
+
+        result = cls._instances.get(service_name)
+        if result is None:
+            with cls._lock:
+                result = cls._instances.get(service_name)
+                if result is None:
+                    result = cls.create_service(service_name)
+                    if result is not None:
+                        cls._instances[service_name] = result
+
+        return result
+
+    @classmethod
+    def override(cls, service_name, service):
+        """
+        Make get_service() return the given instance, e.g. a fake in tests.
+        """
+        cls._overrides[service_name] = service
+
+    @classmethod
+    def clear_overrides(cls):
+        cls._overrides.clear()
+
+    @classmethod
+    def warm(cls):
+        """
+        Build the services listed in `services` and call warm() on those that have one, so they
+        can prepare (build schemas, fill caches, ...) before the first request. Synchronous, so
+        it can run at import time, e.g. in a serverless init phase.
+        """
+        for service_name in cls.services:
+            service = cls.get_service(service_name)
+            warm = getattr(service, "warm", None)
+            if warm is not None:
+                warm()
+
+    @classmethod
+    async def startup(cls):
+        """
+        Build and warm the services listed in `services`. Call once when the application starts.
+        """
+        cls.warm()
+
+    @classmethod
+    async def shutdown(cls):
+        """
+        Close and forget every instance built by this factory. Services can release resources by
+        implementing aclose() (awaited) or close().
+        """
+        with cls._lock:
+            instances = list(cls._instances.values())
+            cls._instances.clear()
 
+        for service in instances:
+            close = getattr(service, "aclose", None) or getattr(service, "close", None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
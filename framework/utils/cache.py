@@ -0,0 +1,212 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe least-recently-used cache. Entries can carry their own time to live,
+    and the cache counts hits and misses so callers can check that it is doing its job.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, clock=time.monotonic):
+        """
+        :param maxsize: Maximum number of entries before the least recently used one is evicted.
+        :param ttl: Default time to live in seconds. None means entries never expire on their own.
+        :param clock: Monotonic time source, overridable for tests.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()     # key -> (value, expires_at or None)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self.clock():
+                    self._data.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+                self._remove(key)
+
+            if count:
+                self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Store a value. `ttl` overrides the cache default for this entry; a ttl <= 0 is not stored.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            return
+        expires_at = self.clock() + ttl if ttl is not None else None
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at)
+            self._added(key, value)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _added(self, key: Hashable, value: Any):
+        """Hook for subclasses that track more than the entry count."""
+        pass
+
+    def _remove(self, key: Hashable):
+        del self._data[key]
+
+
+class SizedLRUCache(LRUCache):
+    """
+    An LRUCache that is also bounded by the total size of its values, as measured by `sizeof`.
+    """
+
+    def __init__(self, maxsize: int = 1024, maxbytes: Optional[int] = None, sizeof=len, **kwargs):
+        """
+        :param maxbytes: Maximum total size of the values. None means only the entry count is bounded.
+        :param sizeof: Function returning the size in bytes of a value.
+        """
+        super().__init__(maxsize=maxsize, **kwargs)
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._sizes = {}
+
+    def stats(self) -> dict:
+        result = super().stats()
+        result.update(bytes=self.bytes, maxbytes=self.maxbytes)
+        return result
+
+    def _added(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        self._sizes[key] = size
+        self.bytes += size
+        if self.maxbytes is not None:
+            # Evict from the least recently used end, but always keep the entry just added
+            while self.bytes > self.maxbytes and len(self._data) > 1:
+                oldest = next(iter(self._data))
+                if oldest == key:
+                    break
+                self._remove(oldest)
+
+    def _remove(self, key: Hashable):
+        super()._remove(key)
+        self.bytes -= self._sizes.pop(key, 0)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Async result cache. A value is fresh for `ttl` seconds; for `stale_ttl` seconds after that it
+    is still served, while a single background task reloads it. Only callers that find nothing
+    usable wait for the loader.
+    """
+
+    def __init__(self,
+                 ttl: float,
+                 stale_ttl: float = 0.0,
+                 maxsize: int = 1024,
+                 maxbytes: Optional[int] = None,
+                 sizeof=len,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.stale_hits = 0
+        self._cache = SizedLRUCache(maxsize=maxsize, maxbytes=maxbytes, clock=clock,
+                                    sizeof=lambda entry: sizeof(entry[0]))
+        self._refreshing = {}
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def stats(self) -> dict:
+        result = self._cache.stats()
+        result.update(stale_hits=self.stale_hits, refreshing=len(self._refreshing))
+        return result
+
+    def clear(self):
+        self._cache.clear()
+
+    async def get_or_load(self, key: Hashable, loader, store_if=None) -> Any:
+        """
+        Return the cached value for `key`, calling the coroutine function `loader` when there is
+        none, or refreshing it in the background when it is stale. If given, `store_if(value)`
+        decides whether a loaded value is cached.
+        """
+        entry = self._cache.get(key)
+        if entry is not None:
+            value, fresh_until = entry
+            if fresh_until <= self.clock():
+                self.stale_hits += 1
+                self._refresh(key, loader, store_if)
+            return value
+
+        value = await loader()
+        self._store(key, value, store_if)
+        return value
+
+    def _store(self, key: Hashable, value: Any, store_if=None):
+        if store_if is not None and not store_if(value):
+            return
+        self._cache.set(key, (value, self.clock() + self.ttl), ttl=self.ttl + self.stale_ttl)
+
+    def _refresh(self, key: Hashable, loader, store_if=None):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                self._store(key, await loader(), store_if)
+            except Exception:
+                # Keep serving the stale value; the next caller after it expires loads it again
+                pass
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
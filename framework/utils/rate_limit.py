@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+from typing import Optional
+
+
+class Priority(IntEnum):
+    """Lower values are dispatched first."""
+    INTERACTIVE = 0
+    BULK = 10
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second accumulate up to `capacity`. The bucket can
+    also be paused until a deadline, e.g. when the upstream answers with Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.paused_until = 0.0
+        self._updated = clock()
+
+    def _refill(self, now: float):
+        # Nothing accumulates while paused: refilling resumes at the end of the pause
+        if now > self._updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token can be taken; 0 if one is available now."""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait += (1 - self.tokens) / self.rate
+        return wait
+
+    def try_acquire(self) -> bool:
+        if self.delay() > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for the next `seconds`, and start empty afterwards."""
+        now = self.clock()
+        self._refill(now)
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self._updated = self.paused_until
+
+
+class RequestScheduler:
+    """
+    Admits requests through a shared token bucket in priority order. Callers await acquire()
+    before each upstream call; when the bucket is empty they queue, and a single dispatcher task
+    releases the highest-priority (then oldest) waiter each time a token becomes available.
+    """
+
+    _registry = {}
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.dispatched = 0
+        self.queued = 0
+        self.throttled = 0
+        self.max_queue_depth = 0
+        self._queue = []
+        self._counter = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @classmethod
+    def for_key(cls, key: str, rate: float, capacity: float) -> "RequestScheduler":
+        """
+        Return the scheduler shared by everything calling upstream under `key` (e.g. a Spotify
+        client_id), creating it on first use.
+        """
+        scheduler = cls._registry.get(key)
+        if scheduler is None:
+            scheduler = cls(TokenBucket(rate, capacity))
+            cls._registry[key] = scheduler
+        return scheduler
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[2].done())
+
+    def stats(self) -> dict:
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, future in self._queue:
+            if not future.done():
+                try:
+                    name = Priority(priority).name.lower()
+                except ValueError:
+                    name = str(priority)
+                depth[name] = depth.get(name, 0) + 1
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "max_queue_depth": self.max_queue_depth,
+            "dispatched": self.dispatched,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "tokens": self.bucket.tokens,
+        }
+
+    async def acquire(self, priority: int = Priority.INTERACTIVE):
+        if not self._queue and self.bucket.try_acquire():
+            self.dispatched += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        # A cancelled waiter leaves its future cancelled in the heap; the dispatcher skips it
+        await future
+
+    def backoff(self, seconds: float):
+        """Stop dispatching for `seconds`, e.g. after a 429 with Retry-After."""
+        self.throttled += 1
+        self.bucket.pause(seconds)
+
+    async def _dispatch(self):
+        while self._queue:
+            if self._queue[0][2].done():
+                heapq.heappop(self._queue)
+                continue
+
+            wait = self.bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                self.bucket.tokens -= 1
+                self.dispatched += 1
+                future.set_result(None)
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the work, and everyone
+    who asks for the same key while it is in flight awaits that same result (or exception).
+    Nothing is kept once the call finishes, so this never serves stale data.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._flights.get(key)
+        if task is None:
+            self.calls += 1
+            # Run the work in its own task so a cancelled caller does not cancel it for the others
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda _, key=key: self._flights.pop(key, None))
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
@@ -0,0 +1,33 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """
+    Records how long each phase of process startup (imports, app construction, service warm-up,
+    ...) takes, so cold starts can be broken down and tracked. Only uses the standard library,
+    so it can be imported before anything heavy.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self.clock() - start
+
+    def stats(self) -> dict:
+        return {
+            "phase_seconds": dict(self.phases),
+            "seconds": sum(self.phases.values()),
+        }
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases.items())
+        return f"{sum(self.phases.values()) * 1000:.1f} ms ({phases})"
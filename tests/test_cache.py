@@ -0,0 +1,131 @@
+import asyncio
+
+from framework.utils.cache import LRUCache, SizedLRUCache, StaleWhileRevalidateCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_lru_expires_entries(clock):
+    cache = LRUCache(maxsize=10, ttl=10, clock=clock)
+    cache.set("default", 1)
+    cache.set("short", 2, ttl=1)
+    cache.set("never", 3, ttl=0)
+
+    assert "never" not in cache
+    clock.advance(1)
+    assert cache.get("short") is None
+    assert cache.get("default") == 1
+    clock.advance(9)
+    assert cache.get("default") is None
+    assert len(cache) == 0
+
+
+def test_lru_counts_hits_and_misses():
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert "a" in cache                 # membership checks are not counted
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_sized_lru_evicts_by_bytes():
+    cache = SizedLRUCache(maxsize=10, maxbytes=10)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    assert cache.bytes == 8
+
+    cache.set("c", "xxxx")
+    assert "a" not in cache
+    assert cache.bytes == 8
+
+    # An entry larger than the budget is kept alone rather than dropped
+    cache.set("d", "x" * 20)
+    assert len(cache) == 1 and cache.get("d") == "x" * 20
+    assert cache.bytes == 20
+
+
+def test_sized_lru_replacing_and_popping_adjusts_bytes():
+    cache = SizedLRUCache(maxsize=10, maxbytes=100)
+    cache.set("a", "xxxx")
+    cache.set("a", "xx")
+    assert cache.bytes == 2
+    assert cache.pop("a") == "xx"
+    assert cache.bytes == 0
+
+
+def test_stale_while_revalidate(clock):
+    cache = StaleWhileRevalidateCache(ttl=10, stale_ttl=5, clock=clock)
+    loads = []
+
+    async def loader():
+        loads.append(clock())
+        return f"v{len(loads)}"
+
+    async def run():
+        assert await cache.get_or_load("k", loader) == "v1"
+        assert await cache.get_or_load("k", loader) == "v1"
+        assert len(loads) == 1
+
+        # Stale: the old value is served and a single refresh runs in the background
+        clock.advance(11)
+        assert await cache.get_or_load("k", loader) == "v1"
+        assert await cache.get_or_load("k", loader) == "v1"
+        assert cache.stats()["refreshing"] == 1
+        await asyncio.sleep(0)
+        assert len(loads) == 2
+        assert await cache.get_or_load("k", loader) == "v2"
+
+        # Past the stale window the caller waits for a fresh load
+        clock.advance(16)
+        assert await cache.get_or_load("k", loader) == "v3"
+        assert cache.stale_hits == 2
+
+    asyncio.run(run())
+
+
+def test_stale_while_revalidate_keeps_stale_value_when_refresh_fails(clock):
+    cache = StaleWhileRevalidateCache(ttl=10, stale_ttl=5, clock=clock)
+
+    async def load():
+        return "value"
+
+    async def fail():
+        raise RuntimeError("upstream down")
+
+    async def run():
+        await cache.get_or_load("k", load)
+        clock.advance(11)
+        assert await cache.get_or_load("k", fail) == "value"
+        await asyncio.sleep(0)
+        assert cache.stats()["refreshing"] == 0
+        assert await cache.get_or_load("k", fail) == "value"
+
+    asyncio.run(run())
+
+
+def test_stale_while_revalidate_store_if(clock):
+    cache = StaleWhileRevalidateCache(ttl=10, clock=clock)
+    results = iter([[], ["song"]])
+
+    async def loader():
+        return next(results)
+
+    async def run():
+        assert await cache.get_or_load("k", loader, store_if=bool) == []
+        assert await cache.get_or_load("k", loader, store_if=bool) == ["song"]
+        assert await cache.get_or_load("k", loader, store_if=bool) == ["song"]
+
+    asyncio.run(run())
@@ -0,0 +1,96 @@
+import asyncio
+
+from framework.utils.rate_limit import Priority, RequestScheduler, TokenBucket
+
+# Scheduler tests refill at this rate, a power of two so that clock steps add up to whole tokens
+STEPS = 128
+
+
+def test_bucket_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay() == 0.5
+
+    clock.advance(0.5)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    clock.advance(60)
+    assert bucket.delay() == 0
+    assert bucket.tokens == 2
+
+
+def test_bucket_pause_holds_tokens_until_deadline(clock):
+    bucket = TokenBucket(rate=8, capacity=5, clock=clock)
+    bucket.pause(3)
+    # Starts empty after the pause, so one token's worth of refill is needed on top
+    assert bucket.delay() == 3 + 1 / 8
+    clock.advance(2)
+    assert not bucket.try_acquire()
+
+    clock.advance(1)
+    assert bucket.delay() == 1 / 8
+    clock.advance(1 / 8)
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_scheduler_dispatches_by_priority_then_age(clock):
+    scheduler = RequestScheduler(TokenBucket(rate=STEPS, capacity=3, clock=clock))
+    scheduler.bucket.tokens = 0
+    order = []
+
+    async def request(name, priority):
+        await scheduler.acquire(priority)
+        order.append(name)
+
+    async def run():
+        tasks = [asyncio.create_task(request(name, priority)) for name, priority in [
+            ("bulk-1", Priority.BULK),
+            ("interactive-1", Priority.INTERACTIVE),
+            ("bulk-2", Priority.BULK),
+            ("interactive-2", Priority.INTERACTIVE),
+        ]]
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 4
+        assert order == []
+
+        # The clock only moves here, so the dispatcher finds three tokens at once
+        clock.advance(3 / STEPS)
+        await asyncio.wait_for(asyncio.gather(*tasks[1:4:2]), timeout=5)
+        await asyncio.sleep(0)
+        assert order == ["interactive-1", "interactive-2", "bulk-1"]
+
+        clock.advance(1 / STEPS)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+        assert order[-1] == "bulk-2"
+        assert scheduler.stats()["dispatched"] == 4
+
+    asyncio.run(run())
+
+
+def test_scheduler_skips_cancelled_waiters(clock):
+    scheduler = RequestScheduler(TokenBucket(rate=STEPS, capacity=1, clock=clock))
+    scheduler.bucket.tokens = 0
+
+    async def run():
+        cancelled = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE))
+        waiting = asyncio.create_task(scheduler.acquire(Priority.BULK))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        clock.advance(1 / STEPS)
+        await asyncio.wait_for(waiting, timeout=5)
+        assert scheduler.dispatched == 1
+        assert scheduler.bucket.tokens < 1
+
+    asyncio.run(run())
+
+
+def test_scheduler_backoff_pauses_dispatch(clock):
+    scheduler = RequestScheduler(TokenBucket(rate=STEPS, capacity=1, clock=clock))
+    scheduler.backoff(2)
+    assert scheduler.throttled == 1
+    assert scheduler.bucket.delay() == 2 + 1 / STEPS
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from framework.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flights = SingleFlight()
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0)
+        return "result"
+
+    async def run():
+        results = await asyncio.gather(*[flights.do("k", work) for _ in range(5)])
+        assert results == ["result"] * 5
+        assert len(started) == 1
+        assert (flights.calls, flights.shared) == (1, 4)
+        assert len(flights) == 0
+
+        # Nothing is kept: the next call runs the work again
+        await flights.do("k", work)
+        assert len(started) == 2
+
+    asyncio.run(run())
+
+
+def test_different_keys_do_not_share():
+    flights = SingleFlight()
+
+    async def work(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def run():
+        results = await asyncio.gather(flights.do("a", lambda: work(1)), flights.do("b", lambda: work(2)))
+        assert results == [1, 2]
+        assert flights.shared == 0
+
+    asyncio.run(run())
+
+
+def test_exception_is_shared():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0)
+        raise ValueError("boom")
+
+    async def run():
+        results = await asyncio.gather(flights.do("k", work), flights.do("k", work), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert len(flights) == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+    release = None
+
+    async def work():
+        await release.wait()
+        return "result"
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(flights.do("k", work))
+        second = asyncio.create_task(flights.do("k", work))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        release.set()
+        assert await second == "result"
+        assert flights.calls == 1
+
+    asyncio.run(run())
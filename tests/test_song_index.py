@@ -0,0 +1,50 @@
+import numpy as np
+
+from app.services.song_index import SongIndex
+
+
+def make_index(**kwargs) -> SongIndex:
+    index = SongIndex(["danceability", "tempo"], **kwargs)
+    index.build(np.array([[0.3, 100.0],
+                          [0.5, 120.0],
+                          [0.7, 140.0],
+                          [np.nan, 160.0]]),
+                [["pop"], ["rock", "indie"], ["pop"], ["jazz"]])
+    return index
+
+
+def test_range_bounds_are_inclusive():
+    index = make_index()
+    assert index.candidates({"danceability": (0.7, None)}).tolist() == [2]
+    assert index.candidates({"danceability": (None, 0.3)}).tolist() == [0]
+    assert index.candidates({"danceability": (0.3, 0.7)}).tolist() == [0, 1, 2]
+    assert index.candidates({"danceability": (0.5, 0.5)}).tolist() == [1]
+
+
+def test_range_bounds_are_inclusive_when_probing():
+    index = make_index()
+    # The genre is more selective, so the danceability bound is checked against the matrix
+    assert index.candidates({"danceability": (0.7, None)}, genres=["indie"]).tolist() == []
+    assert index.candidates({"danceability": (0.5, 0.5)}, genres=["indie"]).tolist() == [1]
+    assert index.candidates({"tempo": (None, 100.0), "danceability": (0.3, None)}).tolist() == [0]
+
+
+def test_rows_without_a_value_never_match_a_bound():
+    index = make_index()
+    assert index.candidates({"danceability": (None, None)}).tolist() == [0, 1, 2, 3]
+    assert 3 not in index.candidates({"danceability": (0.0, 1.0)}).tolist()
+
+
+def test_genres_match_any_label_case_insensitively():
+    index = make_index()
+    assert index.candidates(genres=["POP", "Indie"]).tolist() == [0, 1, 2]
+    assert index.candidates(genres=["metal"]).tolist() == []
+
+
+def test_added_rows_are_searchable_before_rebuild():
+    index = make_index(min_rebuild=100)
+    rows = index.add(np.array([[0.7, 90.0]]), [["pop"]])
+
+    assert rows.tolist() == [4]
+    assert index.indexed == 4
+    assert index.candidates({"danceability": (0.7, 0.7)}, genres=["pop"]).tolist() == [2, 4]
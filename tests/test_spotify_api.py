@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+from app.models.song import Traits
+from app.models.spotify_token import SpotifyToken
+from app.services.spotify_api import SpotifyAPIService
+from app.services.spotify_client import SpotifyClient
+from benchmarks import fake_spotify
+
+TRACK_PAGES = "GET /v1/playlists/{playlist_id}/tracks"
+
+
+def make_service(**config):
+    spotify = fake_spotify.create_app(fake_spotify.FakeSpotifyConfig(**config))
+    http = SpotifyClient(transport=fake_spotify.transport(spotify))
+    return SpotifyAPIService("client", "secret", http), spotify
+
+
+def make_token() -> SpotifyToken:
+    return SpotifyToken(access_token="access", token_type="Bearer", scope="", expires_in=3600,
+                        refresh_token="refresh")
+
+
+def test_streamed_playlists_wait_for_a_slow_reader():
+    async def run():
+        api_service, spotify = make_service(playlists=60, tracks_per_playlist=10)
+        playlists = api_service.iter_user_playlists(make_token(), concurrency=2)
+        try:
+            first = await playlists.__anext__()
+            # However long the reader takes, only a window of playlists is fetched ahead of it
+            await asyncio.sleep(0.2)
+            assert spotify.state.calls[TRACK_PAGES] <= 4
+
+            rest = [playlist async for playlist in playlists]
+        finally:
+            await api_service.aclose()
+
+        assert len({first.id, *(playlist.id for playlist in rest)}) == 60
+        assert spotify.state.calls[TRACK_PAGES] == 60
+
+    asyncio.run(run())
+
+
+def test_streamed_playlists_match_get_user_playlists():
+    async def run():
+        api_service, _ = make_service(playlists=7, tracks_per_playlist=150)
+        try:
+            listed = await api_service.get_user_playlists(make_token())
+            streamed = [playlist async for playlist in api_service.iter_user_playlists(make_token())]
+        finally:
+            await api_service.aclose()
+
+        assert sorted(streamed, key=lambda playlist: playlist.id) == sorted(listed, key=lambda playlist: playlist.id)
+        assert all(len(playlist.tracks) == 150 for playlist in streamed)
+
+    asyncio.run(run())
+
+
+def test_search_ignores_bounds_on_traits_spotify_does_not_return():
+    async def run():
+        api_service, spotify = make_service()
+        try:
+            traits = Traits(genres=["pop"], min_tempo=125, max_tempo=126, max_danceability=0.31, limit=10)
+            songs, complete = await api_service._search_recommendations(traits)
+        finally:
+            await api_service.aclose()
+
+        assert complete and len(songs) == 10
+        assert spotify.state.calls["GET /v1/search"] == 1
+
+    asyncio.run(run())
+
+
+def test_search_filters_on_popularity():
+    async def run():
+        api_service, spotify = make_service()
+        try:
+            songs, _ = await api_service._search_recommendations(Traits(genres=["pop", "rock"], min_popularity=70,
+                                                                        limit=20))
+        finally:
+            await api_service.aclose()
+
+        assert len(songs) == 20
+        assert all(song.track_popularity >= 70 for song in songs)
+
+    asyncio.run(run())
+
+
+def test_search_replaces_a_rejected_app_token():
+    async def run():
+        api_service, spotify = make_service()
+        try:
+            first = await api_service.app_token.get_access_token()
+            spotify.state.revoked.add(first)
+            songs, complete = await api_service._search_recommendations(Traits(genres=["pop"], limit=5))
+            second = await api_service.app_token.get_access_token()
+        finally:
+            await api_service.aclose()
+
+        assert complete and len(songs) == 5
+        assert second != first
+        assert spotify.state.calls["POST /api/token"] == 2
+        assert spotify.state.calls["GET /v1/search"] == 2
+
+    asyncio.run(run())
+
+
+def test_search_does_not_retry_a_rejected_user_token():
+    async def run():
+        spotify = fake_spotify.create_app()
+        # Without client credentials, catalog calls use the caller's token
+        api_service = SpotifyAPIService(None, None, SpotifyClient(transport=fake_spotify.transport(spotify)))
+        spotify.state.revoked.add("user")
+        try:
+            with pytest.raises(Exception, match="401"):
+                await api_service._search_genre("pop", 5, "user")
+        finally:
+            await api_service.aclose()
+
+        assert spotify.state.calls["GET /v1/search"] == 1
+
+    asyncio.run(run())
+
+
+def make_songs(count: int) -> list:
+    return [f"song{i:04d}" for i in range(count)]
+
+
+def test_create_playlist_adds_tracks_in_chunks_at_their_positions():
+    async def run():
+        api_service, spotify = make_service()
+        try:
+            playlist = await api_service.create_playlist("user", make_token(), "Mix", make_songs(250))
+        finally:
+            await api_service.aclose()
+
+        assert [(chunk.position, chunk.size) for chunk in playlist.chunks] == [(0, 100), (100, 100), (200, 50)]
+        assert spotify.state.contents[playlist.id] == [f"spotify:track:{song}" for song in make_songs(250)]
+
+    asyncio.run(run())
+
+
+def test_create_playlist_retries_a_chunk_answered_with_503():
+    async def run():
+        api_service, spotify = make_service()
+        spotify.state.insert_faults = [(None, True), (503, False)]
+        try:
+            playlist = await api_service.create_playlist("user", make_token(), "Mix", make_songs(150))
+        finally:
+            await api_service.aclose()
+
+        assert [chunk.attempts for chunk in playlist.chunks] == [1, 2]
+        assert spotify.state.contents[playlist.id] == [f"spotify:track:{song}" for song in make_songs(150)]
+
+    asyncio.run(run())
+
+
+def test_create_playlist_does_not_retry_a_chunk_that_may_have_landed():
+    async def run():
+        api_service, spotify = make_service()
+        # The gateway times out after Spotify has already added the chunk
+        spotify.state.insert_faults = [(504, True)]
+        try:
+            with pytest.raises(Exception, match="may have been added"):
+                await api_service.create_playlist("user", make_token(), "Mix", make_songs(150))
+        finally:
+            await api_service.aclose()
+
+        assert spotify.state.calls["POST /v1/playlists/{playlist_id}/tracks"] == 1
+        (contents,) = spotify.state.contents.values()
+        assert contents == [f"spotify:track:{song}" for song in make_songs(100)]
+
+    asyncio.run(run())
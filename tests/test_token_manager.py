@@ -0,0 +1,104 @@
+import asyncio
+
+from app.models.spotify_token import SpotifyToken
+from app.services.token_manager import SpotifyTokenManager
+
+
+def make_token(access_token: str, expires_in: int = 3600) -> SpotifyToken:
+    return SpotifyToken(access_token=access_token, token_type="Bearer", scope="",
+                        expires_in=expires_in, refresh_token="refresh")
+
+
+class FakeAPIService:
+    def __init__(self):
+        self.refreshed = 0
+
+    async def refresh_token(self, token: SpotifyToken) -> SpotifyToken:
+        self.refreshed += 1
+        return make_token(f"refreshed{self.refreshed}")
+
+
+async def settle():
+    """Let the background refresh tasks run to completion."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def make_manager(clock, **kwargs) -> SpotifyTokenManager:
+    return SpotifyTokenManager(FakeAPIService(), refresh_margin=60, idle_timeout=600, evict_after=3600,
+                               clock=clock, **kwargs)
+
+
+def test_active_users_are_refreshed_in_the_background(clock):
+    async def run():
+        manager = make_manager(clock)
+        # Due for refresh straight away
+        manager.store("user", make_token("first", expires_in=60))
+        await settle()
+
+        assert manager.refreshes == 1
+        assert (await manager.get_token("user")).access_token == "refreshed1"
+        await manager.aclose()
+
+    asyncio.run(run())
+
+
+def test_idle_users_are_refreshed_on_their_next_request(clock):
+    async def run():
+        manager = make_manager(clock)
+        manager.store("user", make_token("first", expires_in=60))
+        clock.advance(601)
+        await settle()
+
+        assert manager.refreshes == 0
+        assert manager.stats()["scheduled"] == 0
+        assert "user" in manager
+        assert (await manager.get_token("user")).access_token == "refreshed1"
+        await manager.aclose()
+
+    asyncio.run(run())
+
+
+def test_users_idle_past_evict_after_are_forgotten(clock):
+    manager = make_manager(clock)
+    manager.store("idle", make_token("a"))
+    clock.advance(3601)
+
+    assert asyncio.run(manager.get_token("idle")) is None
+    assert "idle" not in manager
+
+    # Storing a token also sweeps out users idle that long
+    manager.store("other", make_token("b"))
+    clock.advance(3601)
+    manager.store("new", make_token("c"))
+    assert "other" not in manager
+    assert manager.evictions == 2
+
+
+def test_least_recently_seen_users_are_evicted_over_max_users(clock):
+    manager = make_manager(clock, max_users=2)
+    manager.store("a", make_token("a"))
+    manager.store("b", make_token("b"))
+    clock.advance(1)
+    asyncio.run(manager.get_token("a"))
+    manager.store("c", make_token("c"))
+
+    assert "b" not in manager
+    assert "a" in manager and "c" in manager
+    assert len(manager) == 2
+
+
+def test_tokens_are_returned_with_the_time_they_have_left(clock):
+    manager = make_manager(clock)
+    manager.store("user", make_token("first", expires_in=3600))
+    clock.advance(3000)
+
+    token = asyncio.run(manager.get_token("user"))
+    assert token.access_token == "first"
+    assert token.expires_in == 600
+
+    # Refreshed inside the margin, the new token has its full lifetime left
+    clock.advance(550)
+    token = asyncio.run(manager.get_token("user"))
+    assert token.access_token == "refreshed1"
+    assert token.expires_in == 3600
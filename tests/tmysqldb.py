@@ -20,5 +20,17 @@ def t1():
     print("t1 result = \n", json.dumps(result, indent=4, default=str))
 
 
+def t2():
+    data_service = get_db_service()
+    result = data_service.get_data_objects(
+        "course_management",
+        "course_sections",
+        key_field="sis_course_id",
+        key_values=["COMSW4153_001_2024_3", "COMSW4153_001_2024_3", "NOT_A_SECTION"]
+    )
+    print("t2 result = \n", json.dumps(result, indent=4, default=str))
+
+
 if __name__ == '__main__':
-    t1()
\ No newline at end of file
+    t1()
+    t2()
\ No newline at end of file
@@ -0,0 +1,48 @@
+from framework.services.data_access.AsyncSQLiteDataService import AsyncSQLiteDataService
+import asyncio
+import json
+
+
+async def get_db_service():
+    data_service = AsyncSQLiteDataService()
+    await data_service.execute(
+        "course_management",
+        "CREATE TABLE course_management.course_sections (sis_course_id TEXT PRIMARY KEY, title TEXT)"
+    )
+    await data_service.insert_data_objects("course_management", "course_sections", [
+        {"sis_course_id": "COMSW4153_001_2024_3", "title": "Cloud Computing"},
+        {"sis_course_id": "COMSW4111_001_2024_3", "title": "Introduction to Databases"},
+    ])
+    return data_service
+
+
+async def t1():
+    data_service = await get_db_service()
+    result = await data_service.get_data_object(
+        "course_management",
+        "course_sections",
+        key_field="sis_course_id",
+        key_value="COMSW4153_001_2024_3"
+    )
+    print("t1 result = \n", json.dumps(result, indent=4, default=str))
+    await data_service.aclose()
+
+
+async def t2():
+    data_service = await get_db_service()
+    await data_service.insert_data_objects("course_management", "course_sections", [
+        {"sis_course_id": "COMSW4153_001_2024_3", "title": "Cloud Computing (upserted)"},
+    ], upsert=True)
+    result = await data_service.get_data_objects(
+        "course_management",
+        "course_sections",
+        key_field="sis_course_id",
+        key_values=["COMSW4153_001_2024_3", "COMSW4111_001_2024_3", "NOT_A_SECTION"]
+    )
+    print("t2 result = \n", json.dumps(result, indent=4, default=str))
+    await data_service.aclose()
+
+
+if __name__ == '__main__':
+    asyncio.run(t1())
+    asyncio.run(t2())